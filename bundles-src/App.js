@@ -13,6 +13,8 @@ import NoResults from "./components/NoResults";
 
 import './css/App.css';
 
+const PRODUCTS_URL = '/api/products/?limit=24&fields=id,name,price,image,srcset,category,description,special_status';
+
 class App extends Component {
 
   constructor(props){
@@ -20,6 +22,7 @@ class App extends Component {
     this.state = {
       banners: [],  // null represent "Loading" state, will be replaced by Array on server response
       products: null,  // null represent "Loading" state, will be replaced by Array on server response
+      nextProductsUrl: null,
       term: '',
       cart: [],
       quickViewProduct: null,  // will be replaced by selected product attributes
@@ -37,6 +40,8 @@ class App extends Component {
     this.handleCheckout=this.handleCheckout.bind(this);
     this.handleCheckoutModalShow=this.handleCheckoutModalShow.bind(this);
     this.handleCheckoutModalClose=this.handleCheckoutModalClose.bind(this);
+    this.loadProductsIfVisible = this.loadProductsIfVisible.bind(this);
+    this.productsEnd = React.createRef();
   }
 
   handleCheckoutModalShow(){
@@ -62,6 +67,10 @@ class App extends Component {
 
     let csrfToken = document.querySelector("[name=csrfmiddlewaretoken]").value;
 
+    // The key survives network errors only, so a retry of the same
+    // checkout can't create a second order
+    this.orderKey = this.orderKey || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
     try {
       let response = await fetch(url, {
         method: 'post',
@@ -69,9 +78,11 @@ class App extends Component {
           'Accept': 'application/json',
           'Content-Type': 'application/json',
           'X-CSRFToken': csrfToken,
+          'Idempotency-Key': this.orderKey,
         },
         body: JSON.stringify(data),
       });
+      this.orderKey = null;
 
       if (!response.ok){
         alert('Ошибка при оформлении заказа. Попробуйте ещё раз или свяжитесь с нами по телефону.');
@@ -101,22 +112,45 @@ class App extends Component {
   }
 
 
-  async getProducts(){
-    let response = await fetch('/api/products/', {
-      headers: {
-        'Accept': 'application/json',
-        'Content-Type': 'application/json',
+  async getProducts(url){
+    if (this.productsLoading){
+      return;
+    }
+    this.productsLoading = true;
+    let data = null;
+    try {
+      let response = await fetch(url, {
+        headers: {
+          'Accept': 'application/json',
+          'Content-Type': 'application/json',
+        }
+      });
+      if (response.ok){
+        data = await response.json();
       }
-    });
+    } finally {
+      this.productsLoading = false;
+    }
 
-    if (!response.ok){
+    if (!data){
       return;
     }
+    this.setState(state => ({
+      products : (state.products || []).concat(data.results),
+      nextProductsUrl: data.next,
+    }), this.loadProductsIfVisible);
+  }
 
-    let data = await response.json();
-    this.setState({
-      products : data
-    });
+  // Next page is fetched when the end of the menu scrolls into view.
+  // A short search result keeps it in view until the catalog is loaded
+  loadProductsIfVisible(){
+    let productsEnd = this.productsEnd.current;
+    if (!this.state.nextProductsUrl || !productsEnd){
+      return;
+    }
+    if (productsEnd.getBoundingClientRect().top < window.innerHeight + 600){
+      this.getProducts(this.state.nextProductsUrl);
+    }
   }
 
   async getBanners(){
@@ -138,14 +172,24 @@ class App extends Component {
   }
 
   componentDidMount(){
-    this.getProducts();
+    this.getProducts(PRODUCTS_URL);
     this.getBanners();
+    this.productsObserver = new IntersectionObserver(entries => {
+      if (entries.some(entry => entry.isIntersecting)){
+        this.loadProductsIfVisible();
+      }
+    }, {rootMargin: '600px'});
+    this.productsObserver.observe(this.productsEnd.current);
+  }
+
+  componentWillUnmount(){
+    this.productsObserver.disconnect();
   }
 
 
   // Search by Keyword
   handleSearch(event){
-    this.setState({term: event.target.value});
+    this.setState({term: event.target.value}, this.loadProductsIfVisible);
   }
 
   handleCartClose() {
@@ -330,6 +374,8 @@ class App extends Component {
 
           { menuBlocks }
 
+          <div ref={this.productsEnd}></div>
+
           <br/>
           <br/>
           <br/>
@@ -39,13 +39,23 @@ class Product extends Component{
 
   render(){
     let image = this.props.product.image;
+    let srcset = this.props.product.srcset;
     let name = this.props.product.name;
     let price = this.props.product.price;
     let id = this.props.product.id;
     return (
       <div className="product">
         <div className="product-image">
-          <img src={image} alt={name} onClick={this.quickView.bind(this)}/>
+          <picture>
+            {srcset && <source type="image/webp" srcSet={srcset.webp} sizes="(max-width: 600px) 100vw, 400px"/>}
+            <img
+              src={image}
+              srcSet={srcset ? srcset.jpeg : undefined}
+              sizes="(max-width: 600px) 100vw, 400px"
+              alt={name}
+              onClick={this.quickView.bind(this)}
+            />
+          </picture>
         </div>
         <h4 className="product-name">{name}</h4>
         <p className="product-price currency">{price}</p>
@@ -7,6 +7,7 @@ from django.utils.http import url_has_allowed_host_and_scheme
 from star_burger.settings import ALLOWED_HOSTS
 
 from .models import (
+    Banner,
     Order,
     OrderItem,
     Product,
@@ -94,7 +95,8 @@ class ProductAdmin(admin.ModelAdmin):
         if not obj.image:
             return "выберите картинку"
         return format_html(
-            '<img src="{url}" style="max-height: 200px;"/>', url=obj.image.url
+            '<img src="{url}" style="max-height: 200px;"/>',
+            url=obj.get_image_url("card"),
         )
 
     get_image_preview.short_description = "превью"
@@ -106,7 +108,31 @@ class ProductAdmin(admin.ModelAdmin):
         return format_html(
             '<a href="{edit_url}"><img src="{src}" style="max-height: 50px;"/></a>',
             edit_url=edit_url,
-            src=obj.image.url,
+            src=obj.thumbnail_url,
+        )
+
+    get_image_list_preview.short_description = "превью"
+
+
+@admin.register(Banner)
+class BannerAdmin(admin.ModelAdmin):
+    list_display = [
+        "get_image_list_preview",
+        "title",
+        "order",
+    ]
+    list_display_links = [
+        "title",
+    ]
+    list_editable = [
+        "order",
+    ]
+
+    def get_image_list_preview(self, obj):
+        if not obj.image:
+            return "нет картинки"
+        return format_html(
+            '<img src="{src}" style="max-height: 50px;"/>', src=obj.image.url
         )
 
     get_image_list_preview.short_description = "превью"
@@ -126,6 +152,24 @@ class OrderItemInline(admin.TabularInline):
 class OrderAdmin(admin.ModelAdmin):
     inlines = [OrderItemInline]
     autocomplete_fields = ["restaurant"]
+    list_display = [
+        "__str__",
+        "status",
+        "payments",
+        "total",
+        "created_at",
+    ]
+    list_filter = [
+        "status",
+        "payments",
+    ]
+    readonly_fields = [
+        "total",
+    ]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.update_total()
 
     def response_change(self, request, obj):
         next_url = request.GET.get("next")
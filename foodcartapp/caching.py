@@ -0,0 +1,60 @@
+from hashlib import sha1
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .fastjson import dumps
+from .versions import get_version
+
+BANNERS_VERSION = "banners"
+CATALOG_VERSION = "catalog"
+PRODUCTS_VERSION = "products"
+
+
+def get_restaurant_menu_version(restaurant_id):
+    return f"restaurant-menu:{restaurant_id}"
+
+
+class CachedJson:
+    def __init__(self, body):
+        self.body = body
+        self.etag = quote_etag(sha1(body).hexdigest())
+
+
+def get_cached_json(name, build, version_names, timeout=DEFAULT_TIMEOUT):
+    """JSON из build(), закодированный один раз на версию данных.
+
+    Ключ включает версии из version_names, поэтому после сигнала об
+    изменении данных все воркеры сразу видят новую сборку.
+    """
+    versions = ":".join(
+        get_version(version_name) for version_name in version_names
+    )
+    key = f"json:{name}:{versions}"
+    cached_json = cache.get(key)
+    if cached_json is None:
+        cached_json = CachedJson(dumps(build()))
+        cache.set(key, cached_json, timeout=timeout)
+    return cached_json
+
+
+def cached_json_response(
+    request, cached_json, max_age, stale_while_revalidate=0
+):
+    """Ответ с ETag, который на совпавший If-None-Match отдаёт 304."""
+    response = get_conditional_response(request, etag=cached_json.etag)
+    if response is None:
+        response = HttpResponse(
+            cached_json.body, content_type="application/json"
+        )
+    response["ETag"] = cached_json.etag
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=max_age,
+        stale_while_revalidate=stale_while_revalidate,
+    )
+    return response
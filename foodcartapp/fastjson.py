@@ -0,0 +1,76 @@
+import json
+from decimal import Decimal
+
+from django.db.models.fields.files import FieldFile
+from phonenumber_field.phonenumber import PhoneNumber
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(obj):
+    """Типы, которых нет в JSON: цены, телефоны и картинки моделей."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, PhoneNumber):
+        return str(obj)
+    if isinstance(obj, FieldFile):
+        return obj.url if obj else None
+    return JSONEncoder().default(obj)
+
+
+if orjson:
+
+    def dumps(data, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=default, option=option)
+
+    loads = orjson.loads
+    JSONDecodeError = orjson.JSONDecodeError
+
+else:
+
+    class StdlibEncoder(json.JSONEncoder):
+        def default(self, obj):
+            return default(obj)
+
+    def dumps(data, indent=False):
+        return json.dumps(
+            data,
+            cls=StdlibEncoder,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=2 if indent else None,
+            separators=None if indent else (",", ":"),
+        ).encode()
+
+    loads = json.loads
+    JSONDecodeError = json.JSONDecodeError
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Компактный JSON через orjson, отступы только по запросу клиента."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return dumps(data, indent=bool(indent))
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except (JSONDecodeError, UnicodeDecodeError) as error:
+            raise ParseError(f"JSON parse error - {error}")
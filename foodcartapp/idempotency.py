@@ -0,0 +1,63 @@
+from hashlib import sha256
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from star_burger.settings import IDEMPOTENCY_KEY_TTL
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_KEY_MAX_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "Ключ идемпотентности уже использован с другим запросом"
+    default_code = "idempotency_key_reused"
+
+
+def get_request_fingerprint(request):
+    """Читать до request.data: после разбора тело запроса уже недоступно."""
+    return sha256(request.body).hexdigest()
+
+
+def replay_response(key, fingerprint):
+    """Сохранённый ответ на ключ или None, если ключа ещё не было."""
+    try:
+        stored = IdempotencyKey.objects.active().get(key=key)
+    except IdempotencyKey.DoesNotExist:
+        return None
+    if stored.request_fingerprint != fingerprint:
+        raise IdempotencyKeyReused()
+    response = Response(stored.response_body, status=stored.response_status)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def claim_key(key, fingerprint):
+    """Занимает ключ до конца транзакции запроса.
+
+    Параллельный запрос с тем же ключом ждёт на уникальном индексе,
+    пока первый не закоммитится, и получает None.
+    """
+    now = timezone.now()
+    IdempotencyKey.objects.expired().delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                key=key,
+                request_fingerprint=fingerprint,
+                expires_at=now + IDEMPOTENCY_KEY_TTL,
+            )
+    except IntegrityError:
+        return None
+
+
+def store_response(idempotency_key, response):
+    idempotency_key.response_status = response.status_code
+    idempotency_key.response_body = response.data
+    idempotency_key.save(update_fields=["response_status", "response_body"])
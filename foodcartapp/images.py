@@ -0,0 +1,128 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .caching import CATALOG_VERSION, PRODUCTS_VERSION
+from .models import Product
+from .versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels. Smaller originals are never upscaled
+IMAGE_SIZES = {
+    "thumbnail": 100,
+    "card": 400,
+    "full": 1200,
+}
+IMAGE_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 6}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+_executor = ThreadPoolExecutor(max_workers=2)
+
+
+def get_derivative_name(name, size, extension):
+    """burger.jpg -> burger.card.webp, рядом с оригиналом."""
+    root, _ = os.path.splitext(name)
+    return f"{root}.{size}.{extension}"
+
+
+def flatten(image):
+    """RGB для JPEG: прозрачные места заливаются белым, а не чёрным."""
+    if image.mode == "P" and "transparency" in image.info:
+        image = image.convert("RGBA")
+    if image.mode in ("RGBA", "LA"):
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def build_derivatives(image):
+    """Сохраняет уменьшенные копии картинки во всех размерах и форматах.
+
+    Возвращает {размер: {"width": ширина, формат: имя файла}}.
+    """
+    with image.open("rb"):
+        original = ImageOps.exif_transpose(Image.open(image))
+        original.load()
+
+    derivatives = {}
+    for size, max_side in IMAGE_SIZES.items():
+        resized = original.copy()
+        resized.thumbnail((max_side, max_side), Image.LANCZOS)
+        derivatives[size] = {"width": resized.width}
+        for extension, (image_format, options) in IMAGE_FORMATS.items():
+            converted = resized
+            if image_format == "JPEG":
+                converted = flatten(resized)
+            buffer = io.BytesIO()
+            converted.save(buffer, image_format, **options)
+
+            name = get_derivative_name(image.name, size, extension)
+            image.storage.delete(name)
+            derivatives[size][extension] = image.storage.save(
+                name, ContentFile(buffer.getvalue())
+            )
+    return derivatives
+
+
+def get_srcset(storage, derivatives):
+    """{"webp": "url 100w, url 400w, ...", "jpeg": ...} или None."""
+    if not derivatives:
+        return None
+    return {
+        extension: ", ".join(
+            f"{storage.url(derivative[extension])} {derivative['width']}w"
+            for derivative in derivatives.values()
+        )
+        for extension in IMAGE_FORMATS
+    }
+
+
+def build_product_images(product_id):
+    product = Product.objects.filter(pk=product_id).first()
+    if not product or not product.image:
+        return
+    derivatives = build_derivatives(product.image)
+
+    stale_names = {
+        name
+        for derivative in product.image_derivatives.values()
+        for extension, name in derivative.items()
+        if extension in IMAGE_FORMATS
+    } - {
+        derivative[extension]
+        for derivative in derivatives.values()
+        for extension in IMAGE_FORMATS
+    }
+    for name in stale_names:
+        product.image.storage.delete(name)
+
+    # update() skips the post_save handler that scheduled this build
+    Product.objects.filter(pk=product_id).update(image_derivatives=derivatives)
+    bump_version(CATALOG_VERSION, PRODUCTS_VERSION)
+
+
+def _build_in_background(product_id):
+    try:
+        build_product_images(product_id)
+    except Exception:
+        logger.exception("Не удалось нарезать картинку товара %s", product_id)
+    finally:
+        connection.close()
+
+
+def schedule_product_images(product_id):
+    """Нарезает картинки в фоне, когда загрузка уже закоммичена."""
+    transaction.on_commit(
+        lambda: _executor.submit(_build_in_background, product_id)
+    )
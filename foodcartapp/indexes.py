@@ -0,0 +1,68 @@
+from collections import defaultdict
+from functools import reduce
+from operator import and_
+
+from location.spatial import KDTree
+
+from .versions import get_version
+
+MENU_VERSION = "menu"
+RESTAURANTS_VERSION = "restaurants"
+
+_restaurant_index = None
+_menu_index = None
+
+
+class VersionedIndex:
+    def __init__(self, version, data):
+        self.version = version
+        self.data = data
+
+
+def get_restaurant_index(restaurants):
+    """k-d дерево ресторанов, пересобирается при смене версии."""
+    global _restaurant_index
+    version = get_version(RESTAURANTS_VERSION)
+    if _restaurant_index is None or _restaurant_index.version != version:
+        _restaurant_index = VersionedIndex(
+            version, KDTree(restaurants.values_list("id", "lat", "lon"))
+        )
+    return _restaurant_index.data
+
+
+def get_menu_index(menu_items):
+    """Битовые маски ресторанов по продуктам с учётом наличия в меню."""
+    global _menu_index
+    version = get_version(MENU_VERSION)
+    if _menu_index is None or _menu_index.version != version:
+        _menu_index = VersionedIndex(
+            version,
+            build_product_masks(
+                menu_items.filter(availability=True).values_list(
+                    "product_id", "restaurant_id"
+                )
+            ),
+        )
+    return _menu_index.data
+
+
+def build_product_masks(menu_items):
+    """Битовые маски ресторанов по продуктам: бит i — ресторан с id i.
+
+    menu_items — пары (product_id, restaurant_id).
+    """
+    product_masks = defaultdict(int)
+    for product_id, restaurant_id in menu_items:
+        product_masks[product_id] |= 1 << restaurant_id
+    return dict(product_masks)
+
+
+def intersect_masks(masks):
+    return reduce(and_, masks, -1) if masks else 0
+
+
+def iter_bits(mask):
+    while mask:
+        lowest_bit = mask & -mask
+        yield lowest_bit.bit_length() - 1
+        mask ^= lowest_bit
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.images import build_product_images
+from foodcartapp.models import Product
+
+
+class Command(BaseCommand):
+    help = "Нарезает уменьшенные копии картинок товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="пересобрать и те картинки, копии которых уже есть",
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image="")
+        if not options["all"]:
+            products = products.filter(image_derivatives={})
+
+        built = failed = 0
+        for product_id in products.values_list("id", flat=True).iterator():
+            try:
+                build_product_images(product_id)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f"Товар {product_id}: {error}")
+                continue
+            built += 1
+        self.stdout.write(f"Готово {built}, ошибок {failed}")
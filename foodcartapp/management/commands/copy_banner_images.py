@@ -0,0 +1,32 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Banner
+from star_burger.settings import BASE_DIR
+
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
+
+
+class Command(BaseCommand):
+    help = "Копирует в медиа картинки баннеров, которых там ещё нет"
+
+    def handle(self, *args, **options):
+        copied = 0
+        for banner in Banner.objects.exclude(image=""):
+            storage = banner.image.storage
+            if storage.exists(banner.image.name):
+                continue
+            path = os.path.join(
+                ASSETS_DIR, os.path.basename(banner.image.name)
+            )
+            if not os.path.exists(path):
+                self.stderr.write(
+                    f"Нет картинки для баннера {banner.title}: {path}"
+                )
+                continue
+            with open(path, "rb") as image:
+                storage.save(banner.image.name, File(image))
+            copied += 1
+        self.stdout.write(f"Скопировано картинок: {copied}")
@@ -0,0 +1,64 @@
+import time
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Order, Restaurant
+from location.backfill import backfill_locations, exclude_fresh_addresses
+from location.geocoder import fetch_coordinates
+from star_burger.settings import YANDEX_API_KEY
+
+
+class Command(BaseCommand):
+    help = "Геокодирует адреса заказов и ресторанов без координат"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--rps",
+            type=float,
+            default=10,
+            help="не больше запросов к геокодеру в секунду",
+        )
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        addresses = chain(
+            exclude_fresh_addresses(Order.objects.all())
+            .order_by("address")
+            .values_list("address", flat=True)
+            .distinct()
+            .iterator(),
+            exclude_fresh_addresses(Restaurant.objects.coordinates_pending())
+            .order_by("address")
+            .values_list("address", flat=True)
+            .distinct()
+            .iterator(),
+        )
+
+        started_at = time.monotonic()
+        totals = {"seen": 0, "geocoded": 0, "failed": 0}
+        for stats in backfill_locations(
+            addresses,
+            self.fetch,
+            workers=options["workers"],
+            rate=options["rps"],
+            batch_size=options["batch_size"],
+        ):
+            for key in totals:
+                totals[key] += stats[key]
+            elapsed = time.monotonic() - started_at
+            self.stdout.write(
+                f"Просмотрено {totals['seen']}, "
+                f"геокодировано {totals['geocoded']}, "
+                f"ошибок {totals['failed']}, "
+                f"{totals['geocoded'] / elapsed:.1f} адр/с"
+            )
+
+        updated = Restaurant.objects.coordinates_pending().locate()
+        self.stdout.write(
+            self.style.SUCCESS(f"Готово, обновлено ресторанов: {updated}")
+        )
+
+    def fetch(self, address):
+        return fetch_coordinates(YANDEX_API_KEY, address)
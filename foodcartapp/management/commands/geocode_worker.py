@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Restaurant
+from location.geocoder import geocode_cache
+from location.jobs import enqueue_geocoding, process_geocode_jobs
+
+
+class Command(BaseCommand):
+    help = "Геокодирует адреса из очереди задач и новые рестораны"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2,
+            help="пауза в секундах, когда очередь пуста",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="обработать очередь один раз и выйти",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            pending_restaurants = Restaurant.objects.coordinates_pending()
+            # Addresses with a job already are left to its retries
+            enqueue_geocoding(
+                list(
+                    pending_restaurants.without_geocode_job().values_list(
+                        "address", flat=True
+                    )
+                )
+            )
+            processed = process_geocode_jobs(
+                geocode_cache.geocode, limit=options["batch_size"]
+            )
+            processed += pending_restaurants.locate()
+            if processed:
+                self.stdout.write(
+                    f"Обработано задач: {processed}, "
+                    f"кэш: {dict(geocode_cache.stats)}"
+                )
+            elif options["once"]:
+                return
+            else:
+                time.sleep(options["interval"])
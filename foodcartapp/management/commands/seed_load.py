@@ -0,0 +1,273 @@
+import math
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from foodcartapp.caching import CATALOG_VERSION, PRODUCTS_VERSION
+from foodcartapp.indexes import MENU_VERSION, RESTAURANTS_VERSION
+from foodcartapp.models import (
+    Order,
+    OrderItem,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from foodcartapp.versions import bump_version
+from location.addresses import normalize_address
+from location.models import Location
+
+CITY_CENTER = (55.7558, 37.6173)
+CITY_RADIUS_KM = 20
+STREETS = [
+    "Тверская улица",
+    "улица Арбат",
+    "Ленинский проспект",
+    "проспект Мира",
+    "Кутузовский проспект",
+    "улица Покровка",
+    "Мясницкая улица",
+    "Профсоюзная улица",
+    "Ленинградский проспект",
+    "улица Сретенка",
+    "Пятницкая улица",
+    "Новослободская улица",
+]
+ORDER_STATUSES = [
+    (Order.OrderStatus.NEW, 0.1),
+    (Order.OrderStatus.PREPARING, 0.05),
+    (Order.OrderStatus.DELIVERING, 0.05),
+    (Order.OrderStatus.COMPLETED, 0.8),
+]
+
+
+def get_next_pk(model):
+    return (model.objects.aggregate(max_pk=Max("pk"))["max_pk"] or 0) + 1
+
+
+def make_point(generator):
+    """Случайная точка в круге вокруг центра города, в градусах."""
+    distance = CITY_RADIUS_KM * math.sqrt(generator.random())
+    angle = generator.uniform(0, 2 * math.pi)
+    lat = CITY_CENTER[0] + distance * math.cos(angle) / 111.32
+    lon = CITY_CENTER[1] + distance * math.sin(angle) / (
+        111.32 * math.cos(math.radians(CITY_CENTER[0]))
+    )
+    return round(lat, 6), round(lon, 6)
+
+
+def make_address(number):
+    street = STREETS[number % len(STREETS)]
+    return f"Москва, {street}, {number // len(STREETS) + 1}"
+
+
+class Command(BaseCommand):
+    help = "Заполняет базу синтетическими данными для нагрузочных тестов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurants", type=int, default=50)
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument("--products", type=int, default=200)
+        parser.add_argument(
+            "--menu-density",
+            type=float,
+            default=0.7,
+            help="доля товаров в меню каждого ресторана, от 0 до 1",
+        )
+        parser.add_argument("--orders", type=int, default=10000)
+        parser.add_argument(
+            "--items-per-order",
+            type=int,
+            default=4,
+            help="наибольшее число позиций в заказе",
+        )
+        parser.add_argument(
+            "--addresses",
+            type=int,
+            default=5000,
+            help="сколько разных адресов доставки, все уже геокодированы",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not 0 <= options["menu_density"] <= 1:
+            raise CommandError("--menu-density должна быть от 0 до 1")
+        required = ["products", "addresses", "items_per_order"]
+        if any(options[name] < 1 for name in required):
+            raise CommandError(
+                "Нужны хотя бы один товар, один адрес и одна позиция в заказе"
+            )
+
+        self.generator = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        started_at = time.monotonic()
+
+        addresses = self.create_locations(options["addresses"])
+        restaurants = self.create_restaurants(options["restaurants"])
+        products = self.create_products(
+            options["categories"], options["products"]
+        )
+        self.create_menu(restaurants, products, options["menu_density"])
+        self.create_orders(
+            options["orders"],
+            products,
+            addresses,
+            options["items_per_order"],
+        )
+
+        self.reset_sequences()
+        bump_version(
+            MENU_VERSION,
+            RESTAURANTS_VERSION,
+            CATALOG_VERSION,
+            PRODUCTS_VERSION,
+        )
+        self.stdout.write(f"Готово за {time.monotonic() - started_at:.1f} с")
+
+    def bulk_create(self, model, objects, **kwargs):
+        with transaction.atomic():
+            model.objects.bulk_create(
+                objects, batch_size=self.batch_size, **kwargs
+            )
+
+    def create_locations(self, count):
+        addresses = [make_address(number) for number in range(count)]
+        for start in range(0, count, self.batch_size):
+            locations = []
+            for address in addresses[start:start + self.batch_size]:
+                lat, lon = make_point(self.generator)
+                locations.append(
+                    Location(
+                        address=address,
+                        normalized_address=normalize_address(address),
+                        lat=lat,
+                        lon=lon,
+                    )
+                )
+            self.bulk_create(Location, locations, ignore_conflicts=True)
+        self.stdout.write(f"Адресов: {count}")
+        return addresses
+
+    def create_restaurants(self, count):
+        next_pk = get_next_pk(Restaurant)
+        restaurants = []
+        for number in range(count):
+            lat, lon = make_point(self.generator)
+            restaurants.append(
+                Restaurant(
+                    pk=next_pk + number,
+                    name=f"Star Burger {next_pk + number}",
+                    address=make_address(self.generator.randrange(10000)),
+                    lat=lat,
+                    lon=lon,
+                )
+            )
+        self.bulk_create(Restaurant, restaurants)
+        self.stdout.write(f"Ресторанов: {count}")
+        return restaurants
+
+    def create_products(self, categories_count, count):
+        next_pk = get_next_pk(ProductCategory)
+        categories = [
+            ProductCategory(pk=next_pk + number, name=f"Категория {number}")
+            for number in range(categories_count)
+        ]
+        self.bulk_create(ProductCategory, categories)
+
+        next_pk = get_next_pk(Product)
+        products = [
+            Product(
+                pk=next_pk + number,
+                name=f"Товар {next_pk + number}",
+                category=(
+                    self.generator.choice(categories) if categories else None
+                ),
+                price=Decimal(self.generator.randrange(5000, 90000)) / 100,
+                image="seed/product.jpg",
+                special_status=self.generator.random() < 0.1,
+                description="Синтетический товар для нагрузочных тестов",
+            )
+            for number in range(count)
+        ]
+        self.bulk_create(Product, products)
+        self.stdout.write(f"Товаров: {count} в {categories_count} категориях")
+        return products
+
+    def create_menu(self, restaurants, products, density):
+        menu_items = [
+            RestaurantMenuItem(
+                restaurant=restaurant,
+                product=product,
+                availability=self.generator.random() < 0.95,
+            )
+            for restaurant in restaurants
+            for product in products
+            if self.generator.random() < density
+        ]
+        self.bulk_create(RestaurantMenuItem, menu_items)
+        self.stdout.write(f"Позиций меню: {len(menu_items)}")
+
+    def create_orders(self, count, products, addresses, items_per_order):
+        statuses, weights = zip(*ORDER_STATUSES)
+        next_pk = get_next_pk(Order)
+        now = timezone.now()
+        for start in range(0, count, self.batch_size):
+            orders = []
+            order_items = []
+            for pk in range(
+                next_pk + start,
+                next_pk + min(start + self.batch_size, count),
+            ):
+                order = Order(
+                    pk=pk,
+                    firstname="Иван",
+                    lastname=f"Покупатель {pk}",
+                    phonenumber=f"+7999{pk % 10_000_000:07d}",
+                    address=self.generator.choice(addresses),
+                    status=self.generator.choices(statuses, weights)[0],
+                    payments=self.generator.choice(Order.OrderPayments.values),
+                    created_at=now
+                    - timedelta(minutes=self.generator.randrange(43200)),
+                )
+                items = [
+                    OrderItem(
+                        order=order,
+                        product=product,
+                        quantity=self.generator.randint(1, 3),
+                        price=product.price,
+                    )
+                    for product in self.generator.sample(
+                        products,
+                        self.generator.randint(
+                            1, min(items_per_order, len(products))
+                        ),
+                    )
+                ]
+                order.total = sum(item.price * item.quantity for item in items)
+                orders.append(order)
+                order_items.extend(items)
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders, batch_size=self.batch_size)
+                OrderItem.objects.bulk_create(
+                    order_items, batch_size=self.batch_size
+                )
+            self.stdout.write(f"Заказов: {start + len(orders)} из {count}")
+
+    def reset_sequences(self):
+        """Postgres не двигает последовательности при явных pk."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(),
+            [Restaurant, ProductCategory, Product, Order],
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
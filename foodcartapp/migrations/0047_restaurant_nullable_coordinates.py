@@ -0,0 +1,23 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0046_alter_orderitem_quantity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='restaurant',
+            name='lat',
+            field=models.FloatField(blank=True, db_index=True, null=True, verbose_name='Широта'),
+        ),
+        migrations.AlterField(
+            model_name='restaurant',
+            name='lon',
+            field=models.FloatField(blank=True, db_index=True, null=True, verbose_name='Долгота'),
+        ),
+    ]
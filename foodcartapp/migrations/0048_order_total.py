@@ -0,0 +1,40 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:53
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model("foodcartapp", "Order")
+    OrderItem = apps.get_model("foodcartapp", "OrderItem")
+    items_total = (
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .values("order")
+        .annotate(total=Sum(F("quantity") * F("price")))
+        .values("total")
+    )
+    Order.objects.update(
+        total=Coalesce(
+            Subquery(items_total),
+            Value(0),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0047_restaurant_nullable_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Стоимость'),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
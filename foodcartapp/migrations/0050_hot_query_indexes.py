@@ -0,0 +1,30 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0049_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='restaurantmenuitem',
+            name='availability',
+            field=models.BooleanField(default=True, verbose_name='в продаже'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'completed'), _negated=True), fields=['created_at', 'id'], name='order_open_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'completed'), _negated=True), fields=['status', 'created_at'], name='order_open_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurantmenuitem',
+            index=models.Index(fields=['product', 'availability', 'restaurant'], name='menuitem_product_avail_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.15 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+BANNERS = [
+    ("Burger", "burger.jpg", "Tasty Burger at your door step"),
+    ("Spices", "food.jpg", "All Cuisines"),
+    ("New York", "tasty.jpg", "Food is incomplete without a tasty dessert"),
+]
+
+
+def create_banners(apps, schema_editor):
+    """Переносит в базу баннеры, которые раньше были зашиты в код.
+
+    Сами картинки копирует в медиа команда copy_banner_images.
+    """
+    Banner = apps.get_model('foodcartapp', 'Banner')
+    for order, (title, filename, text) in enumerate(BANNERS):
+        Banner.objects.create(
+            title=title, text=text, image=f'banners/{filename}', order=order
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0051_product_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Banner',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=50, verbose_name='заголовок')),
+                ('text', models.CharField(blank=True, max_length=200, verbose_name='текст')),
+                ('image', models.ImageField(upload_to='banners', verbose_name='картинка')),
+                ('order', models.PositiveIntegerField(db_index=True, default=0, verbose_name='порядок')),
+            ],
+            options={
+                'verbose_name': 'баннер',
+                'verbose_name_plural': 'баннеры',
+                'ordering': ['order', 'id'],
+            },
+        ),
+        migrations.RunPython(create_banners, migrations.RunPython.noop),
+    ]
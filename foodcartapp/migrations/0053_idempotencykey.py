@@ -0,0 +1,30 @@
+# Generated by Django 3.2.15 on 2026-10-18 18:07
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0052_banner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='ключ')),
+                ('request_fingerprint', models.CharField(max_length=64, verbose_name='хэш запроса')),
+                ('response_status', models.PositiveSmallIntegerField(null=True, verbose_name='код ответа')),
+                ('response_body', models.JSONField(null=True, verbose_name='тело ответа')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='создан')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='истекает')),
+            ],
+            options={
+                'verbose_name': 'ключ идемпотентности',
+                'verbose_name_plural': 'ключи идемпотентности',
+            },
+        ),
+    ]
@@ -1,16 +1,66 @@
-from collections import defaultdict
-from functools import reduce
-
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import F, Sum
+from django.db.models import Exists, F, OuterRef, Q, Sum
 from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 
-from location.geocoder import calculate_restaurant_distances, get_locations
+from location.geocoder import (
+    calculate_distance_matrix,
+    get_locations,
+    sort_restaurants_by_distance,
+)
+from location.jobs import get_pending_addresses
+from location.models import GeocodeJob
+from star_burger.settings import (
+    DELIVERY_RADIUS_KM,
+    DISTANCE_MODE,
+    NEAREST_RESTAURANTS_LIMIT,
+)
+
+from .indexes import (
+    MENU_VERSION,
+    RESTAURANTS_VERSION,
+    get_menu_index,
+    get_restaurant_index,
+    intersect_masks,
+    iter_bits,
+)
+from .tracking import FieldTrackerMixin
+from .versions import bump_version
+
+
+class RestaurantQuerySet(models.QuerySet):
+    def coordinates_pending(self):
+        return self.filter(Q(lat__isnull=True) | Q(lon__isnull=True))
+
+    def without_geocode_job(self):
+        return self.exclude(address="").exclude(
+            address__in=GeocodeJob.objects.values("address")
+        )
+
+    def locate(self):
+        """Проставляет координаты из Location одним bulk_update, без сигналов.
+
+        Сами адреса геокодирует очередь GeocodeJob: там есть повторы
+        с паузой и предел попыток.
+        """
+        restaurants = list(self)
+        locations = get_locations(
+            {restaurant.address for restaurant in restaurants}
+        )
+        located_restaurants = []
+        for restaurant in restaurants:
+            if restaurant.address in locations:
+                restaurant.lat, restaurant.lon = locations[restaurant.address]
+                located_restaurants.append(restaurant)
+
+        Restaurant.objects.bulk_update(located_restaurants, ["lat", "lon"])
+        if located_restaurants:
+            bump_version(RESTAURANTS_VERSION, MENU_VERSION)
+        return len(located_restaurants)
 
 
-class Restaurant(models.Model):
+class Restaurant(FieldTrackerMixin, models.Model):
     name = models.CharField("название", max_length=50)
     address = models.CharField(
         "адрес",
@@ -22,8 +72,12 @@ class Restaurant(models.Model):
         max_length=50,
         blank=True,
     )
-    lat = models.FloatField("Широта", db_index=True, blank=True)
-    lon = models.FloatField("Долгота", db_index=True, blank=True)
+    lat = models.FloatField("Широта", db_index=True, blank=True, null=True)
+    lon = models.FloatField("Долгота", db_index=True, blank=True, null=True)
+
+    objects = RestaurantQuerySet.as_manager()
+
+    tracked_fields = ["address"]
 
     class Meta:
         verbose_name = "ресторан"
@@ -32,13 +86,25 @@ class Restaurant(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.pk and self.has_changed("address"):
+            self.lat = self.lon = None
+        super().save(*args, **kwargs)
+
+    @property
+    def coordinates_pending(self):
+        return self.lat is None or self.lon is None
+
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = RestaurantMenuItem.objects.filter(
-            availability=True
-        ).values_list("product")
-        return self.filter(pk__in=products)
+        return self.filter(
+            Exists(
+                RestaurantMenuItem.objects.filter(
+                    product=OuterRef("pk"), availability=True
+                )
+            )
+        )
 
 
 class ProductCategory(models.Model):
@@ -52,7 +118,7 @@ class ProductCategory(models.Model):
         return self.name
 
 
-class Product(models.Model):
+class Product(FieldTrackerMixin, models.Model):
     name = models.CharField("название", max_length=50)
     category = models.ForeignKey(
         ProductCategory,
@@ -69,6 +135,12 @@ class Product(models.Model):
         validators=[MinValueValidator(0)],
     )
     image = models.ImageField("картинка")
+    image_derivatives = models.JSONField(
+        "уменьшенные копии картинки",
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     special_status = models.BooleanField(
         "спец.предложение",
         default=False,
@@ -82,6 +154,8 @@ class Product(models.Model):
 
     objects = ProductQuerySet.as_manager()
 
+    tracked_fields = ["image"]
+
     class Meta:
         verbose_name = "товар"
         verbose_name_plural = "товары"
@@ -89,6 +163,17 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    def get_image_url(self, size, extension="jpeg"):
+        """Уменьшенная копия, пока её нет — оригинал."""
+        derivative = self.image_derivatives.get(size)
+        if not derivative:
+            return self.image.url
+        return self.image.storage.url(derivative[extension])
+
+    @property
+    def thumbnail_url(self):
+        return self.get_image_url("thumbnail")
+
 
 class RestaurantMenuItem(models.Model):
     restaurant = models.ForeignKey(
@@ -103,61 +188,134 @@ class RestaurantMenuItem(models.Model):
         related_name="menu_items",
         verbose_name="продукт",
     )
-    availability = models.BooleanField(
-        "в продаже", default=True, db_index=True
-    )
+    availability = models.BooleanField("в продаже", default=True)
 
     class Meta:
         verbose_name = "пункт меню ресторана"
         verbose_name_plural = "пункты меню ресторана"
         unique_together = [["restaurant", "product"]]
+        indexes = [
+            # Covers per-product availability lookups, so they are
+            # answered from the index alone
+            models.Index(
+                fields=["product", "availability", "restaurant"],
+                name="menuitem_product_avail_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.restaurant.name} - {self.product.name}"
 
 
 class OrderQuerySet(models.QuerySet):
-    def get_order_cost(self):
-        return self.annotate(
-            cost=Sum(F("items__quantity") * F("items__product__price"))
-        )
-
     def add_restaurants_with_products(self):
-        menu_items = RestaurantMenuItem.objects.select_related(
-            "restaurant", "product"
-        )
-        product_restaurants_map = defaultdict(list)
-        for menu_item in menu_items:
-            product_restaurants_map[menu_item.product].append(
-                menu_item.restaurant
-            )
-
-        locations = get_locations(set([order.address for order in self]))
+        product_masks = get_menu_index(RestaurantMenuItem.objects.all())
+        addresses = set([order.address for order in self])
+        locations = get_locations(addresses)
+        pending_addresses = get_pending_addresses(addresses - locations.keys())
+        restaurant_index = get_restaurant_index(Restaurant.objects.all())
 
+        orders_restaurant_ids = {}
         for order in self:
-            order_items = order.items.all()
-            grouped_by_product_restaurants = [
-                product_restaurants_map[product.product]
-                for product in order_items
+            restaurant_mask = intersect_masks(
+                [
+                    product_masks.get(order_item.product_id, 0)
+                    for order_item in order.items.all()
+                ]
+            )
+            restaurant_ids = list(iter_bits(restaurant_mask))
+            if order.address in locations:
+                nearest = restaurant_index.nearest(
+                    *locations[order.address],
+                    k=NEAREST_RESTAURANTS_LIMIT,
+                    radius=DELIVERY_RADIUS_KM,
+                    candidates=set(restaurant_ids),
+                )
+                # Restaurants still waiting for coordinates go last
+                restaurant_ids = [
+                    restaurant_id for _, restaurant_id in nearest
+                ] + [
+                    restaurant_id
+                    for restaurant_id in restaurant_ids
+                    if restaurant_id not in restaurant_index
+                ]
+            orders_restaurant_ids[order] = restaurant_ids
+
+        restaurants = Restaurant.objects.in_bulk(
+            set().union(*orders_restaurant_ids.values())
+        )
+        # A stale menu index may still list a deleted restaurant
+        for order, restaurant_ids in orders_restaurant_ids.items():
+            orders_restaurant_ids[order] = [
+                restaurant_id
+                for restaurant_id in restaurant_ids
+                if restaurants.get(restaurant_id)
             ]
-            restaurant_with_product = reduce(
-                set.intersection, map(set, grouped_by_product_restaurants)
+
+        located_orders = [
+            order for order in self if order.address in locations
+        ]
+        located_restaurant_ids = [
+            restaurant_id
+            for restaurant_id in set().union(
+                *[orders_restaurant_ids[order] for order in located_orders]
             )
-            try:
-                order_location = locations[order.address]
-                order.restaurant_with_product = calculate_restaurant_distances(
-                    restaurant_with_product, order_location
+            if not restaurants[restaurant_id].coordinates_pending
+        ]
+        restaurant_columns = {
+            restaurant_id: column
+            for column, restaurant_id in enumerate(located_restaurant_ids)
+        }
+        distances = calculate_distance_matrix(
+            [locations[order.address] for order in located_orders],
+            [
+                (
+                    restaurants[restaurant_id].lat,
+                    restaurants[restaurant_id].lon,
                 )
-            except KeyError:
-                order.restaurant_with_product = [
-                    {"restaurant": restaurant}
-                    for restaurant in restaurant_with_product
+                for restaurant_id in located_restaurant_ids
+            ],
+            DISTANCE_MODE,
+        )
+        order_rows = {order: row for row, order in enumerate(located_orders)}
+
+        for order in self:
+            restaurant_ids = orders_restaurant_ids[order]
+            order.restaurant_with_product = []
+            if order in order_rows:
+                nearest_ids = [
+                    restaurant_id
+                    for restaurant_id in restaurant_ids
+                    if restaurant_id in restaurant_columns
+                ]
+                order.restaurant_with_product = sort_restaurants_by_distance(
+                    [
+                        restaurants[restaurant_id]
+                        for restaurant_id in nearest_ids
+                    ],
+                    distances[
+                        order_rows[order],
+                        [
+                            restaurant_columns[restaurant_id]
+                            for restaurant_id in nearest_ids
+                        ],
+                    ],
+                )
+                restaurant_ids = [
+                    restaurant_id
+                    for restaurant_id in restaurant_ids
+                    if restaurant_id not in restaurant_columns
                 ]
+            order.restaurant_with_product += [
+                {"restaurant": restaurants[restaurant_id]}
+                for restaurant_id in restaurant_ids
+            ]
+            order.coordinates_pending = order.address in pending_addresses
 
         return self
 
 
-class Order(models.Model):
+class Order(FieldTrackerMixin, models.Model):
     class OrderStatus(models.TextChoices):
         NEW = "new", "Новый"
         PREPARING = "preparing", "Готовится"
@@ -190,6 +348,7 @@ class Order(models.Model):
         db_index=True,
     )
     created_at = models.DateTimeField("Создан", default=timezone.now)
+    updated_at = models.DateTimeField("Изменён", auto_now=True, db_index=True)
     called_at = models.DateTimeField(
         "Согласован",
         blank=True,
@@ -217,6 +376,14 @@ class Order(models.Model):
         blank=True,
         db_index=True,
     )
+    total = models.DecimalField(
+        "Стоимость",
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        db_index=True,
+        validators=[MinValueValidator(0)],
+    )
     restaurant = models.ForeignKey(
         Restaurant,
         verbose_name="Ресторан",
@@ -229,13 +396,38 @@ class Order(models.Model):
 
     objects = OrderQuerySet.as_manager()
 
+    tracked_fields = ["address"]
+
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        indexes = [
+            # The manager page only shows unfinished orders, which are a
+            # small share of the table
+            models.Index(
+                fields=["created_at", "id"],
+                name="order_open_created_idx",
+                condition=~Q(status="completed"),
+            ),
+            models.Index(
+                fields=["status", "created_at"],
+                name="order_open_status_idx",
+                condition=~Q(status="completed"),
+            ),
+        ]
 
     def __str__(self):
         return f"Заказ № {self.pk}"
 
+    def update_total(self):
+        self.total = (
+            self.items.aggregate(total=Sum(F("quantity") * F("price")))[
+                "total"
+            ]
+            or 0
+        )
+        self.save(update_fields=["total", "updated_at"])
+
 
 class OrderItem(models.Model):
     """Связывающая модель, которая отображает связь между заказом и продуктом,
@@ -271,3 +463,46 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.product.name} для заказа №{self.order.pk}"
+
+
+class Banner(models.Model):
+    title = models.CharField("заголовок", max_length=50)
+    text = models.CharField("текст", max_length=200, blank=True)
+    image = models.ImageField("картинка", upload_to="banners")
+    order = models.PositiveIntegerField("порядок", default=0, db_index=True)
+
+    class Meta:
+        ordering = ["order", "id"]
+        verbose_name = "баннер"
+        verbose_name_plural = "баннеры"
+
+    def __str__(self):
+        return self.title
+
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+
+class IdempotencyKey(models.Model):
+    """Ответ на запрос с заголовком Idempotency-Key для повторов клиента."""
+
+    key = models.CharField("ключ", max_length=255, unique=True)
+    request_fingerprint = models.CharField("хэш запроса", max_length=64)
+    response_status = models.PositiveSmallIntegerField("код ответа", null=True)
+    response_body = models.JSONField("тело ответа", null=True)
+    created_at = models.DateTimeField("создан", default=timezone.now)
+    expires_at = models.DateTimeField("истекает", db_index=True)
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "ключ идемпотентности"
+        verbose_name_plural = "ключи идемпотентности"
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,8 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    ordering = "id"
+    page_size = 24
+    page_size_query_param = "limit"
+    max_page_size = 100
@@ -1,14 +1,150 @@
-from rest_framework.serializers import ModelSerializer
+from django.db import connection
+from rest_framework.serializers import (
+    CharField,
+    IntegerField,
+    ListSerializer,
+    ModelSerializer,
+    PrimaryKeyRelatedField,
+    Serializer,
+    ValidationError,
+)
 
-from .models import Order, OrderItem
+from .models import Order, OrderItem, Product
+
+PRODUCT_FIELDS = [
+    "id",
+    "name",
+    "price",
+    "special_status",
+    "description",
+    "category",
+    "image",
+    "srcset",
+    "restaurant",
+]
+
+
+class ProductListQuerySerializer(Serializer):
+    """Параметры списка товаров: категория и поля через запятую."""
+
+    category = IntegerField(required=False)
+    fields = CharField(required=False)
+
+    def validate_fields(self, value):
+        fields = [field for field in value.split(",") if field]
+        unknown_fields = set(fields) - set(PRODUCT_FIELDS)
+        if unknown_fields:
+            raise ValidationError(
+                f"Неизвестные поля: {', '.join(sorted(unknown_fields))}"
+            )
+        return fields
+
+
+class ProductField(PrimaryKeyRelatedField):
+    """Берёт товар из context["products"], если товары подгружены заранее
+    одним запросом, иначе ищет в базе сам."""
+
+    def to_internal_value(self, data):
+        products = self.context.get("products")
+        if products is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return products[int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
+def collect_product_ids(orders):
+    """id товаров из сырых данных заказов, некорректные пропускаются."""
+    product_ids = set()
+    for order in orders:
+        if not isinstance(order, dict) or not isinstance(
+            order.get("products"), list
+        ):
+            continue
+        for order_item in order["products"]:
+            if not isinstance(order_item, dict):
+                continue
+            try:
+                product_ids.add(int(order_item.get("product")))
+            except (TypeError, ValueError):
+                continue
+    return product_ids
 
 
 class OrderItemSerializer(ModelSerializer):
+    product = ProductField(queryset=Product.objects.all())
+
     class Meta:
         model = OrderItem
         fields = ["product", "quantity"]
 
 
+def build_order(validated_data):
+    order_data = {
+        field: value
+        for field, value in validated_data.items()
+        if field != "products"
+    }
+    return Order(
+        **order_data,
+        total=sum(
+            order_item["product"].price * order_item["quantity"]
+            for order_item in validated_data["products"]
+        ),
+    )
+
+
+def build_order_items(order, products):
+    return [
+        OrderItem(
+            order=order,
+            product=order_item.get("product"),
+            quantity=order_item.get("quantity"),
+            price=order_item.get("product").price,
+        )
+        for order_item in products
+    ]
+
+
+def preload_products(context, orders):
+    """Один запрос за товарами всех заказов вместо запроса на позицию."""
+    if "products" not in context:
+        context["products"] = Product.objects.in_bulk(
+            collect_product_ids(orders)
+        )
+
+
+class OrderListSerializer(ListSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            preload_products(self.context, data)
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        orders = [build_order(order_data) for order_data in validated_data]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Order.objects.bulk_create(orders)
+        else:
+            # SQLite does not return ids from bulk inserts in Django 3.2
+            for order in orders:
+                order.save()
+        OrderItem.objects.bulk_create(
+            [
+                order_item
+                for order, order_data in zip(orders, validated_data)
+                for order_item in build_order_items(
+                    order, order_data["products"]
+                )
+            ]
+        )
+        return orders
+
+
 class OrderSerializer(ModelSerializer):
     products = OrderItemSerializer(
         many=True, allow_empty=False, write_only=True
@@ -24,19 +160,16 @@ class OrderSerializer(ModelSerializer):
             "phonenumber",
             "products",
         ]
+        list_serializer_class = OrderListSerializer
 
-    def create(self, validated_data):
-        products = validated_data.pop("products")
-        order = Order.objects.create(**validated_data)
-        order_items = [
-            OrderItem(
-                order=order,
-                product=order_item.get("product"),
-                quantity=order_item.get("quantity"),
-                price=order_item.get("product").price,
-            )
-            for order_item in products
-        ]
-        OrderItem.objects.bulk_create(order_items)
+    def to_internal_value(self, data):
+        preload_products(self.context, [data])
+        return super().to_internal_value(data)
 
+    def create(self, validated_data):
+        order = build_order(validated_data)
+        order.save()
+        OrderItem.objects.bulk_create(
+            build_order_items(order, validated_data["products"])
+        )
         return order
@@ -1,31 +1,81 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 
-from location.geocoder import fetch_coordinates
-from location.models import Location
-from star_burger.settings import YANDEX_API_KEY
+from location.jobs import enqueue_geocoding, geocoding_finished
 
-from .models import Order, Restaurant
+from .caching import (
+    BANNERS_VERSION,
+    CATALOG_VERSION,
+    PRODUCTS_VERSION,
+    get_restaurant_menu_version,
+)
+from .images import schedule_product_images
+from .indexes import MENU_VERSION, RESTAURANTS_VERSION
+from .models import (
+    Banner,
+    Order,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from .versions import bump_version
 
 
 @receiver(post_save, sender=Restaurant)
-def add_coordinates(sender, instance, created: bool, **kwargs):
-    if created:
-        lon, lat = fetch_coordinates(YANDEX_API_KEY, instance.address)
-        instance.lon = lon
-        instance.lat = lat
-        instance.save()
+@receiver(post_delete, sender=Restaurant)
+def invalidate_restaurant_index(sender, instance, **kwargs):
+    bump_version(
+        RESTAURANTS_VERSION,
+        MENU_VERSION,
+        get_restaurant_menu_version(instance.id),
+    )
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def invalidate_menu_index(sender, instance, **kwargs):
+    bump_version(
+        MENU_VERSION,
+        CATALOG_VERSION,
+        get_restaurant_menu_version(instance.restaurant_id),
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_products(sender, **kwargs):
+    bump_version(MENU_VERSION, CATALOG_VERSION, PRODUCTS_VERSION)
+
+
+@receiver(post_save, sender=Product)
+def build_product_images(sender, instance, **kwargs):
+    if instance.image and instance.has_changed("image"):
+        schedule_product_images(instance.pk)
+
+
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def invalidate_catalog(sender, **kwargs):
+    bump_version(CATALOG_VERSION, PRODUCTS_VERSION)
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_banners(sender, **kwargs):
+    bump_version(BANNERS_VERSION)
 
 
 @receiver(pre_save, sender=Order)
 def add_location(sender, instance, **kwargs):
-    if instance.pk:
-        old_instance = Order.objects.get(pk=instance.pk)
-        new_address = instance.address
-        if new_address != old_instance.address:
-            coordinates = fetch_coordinates(YANDEX_API_KEY, new_address)
-            if coordinates:
-                lon, lat = coordinates
-                Location.objects.get_or_create(
-                    address=new_address, lat=lat, lon=lon
-                )
+    if instance.pk and instance.has_changed("address"):
+        enqueue_geocoding([instance.address])
+
+
+@receiver(geocoding_finished)
+def touch_located_orders(sender, addresses, **kwargs):
+    """Заказы с новыми координатами попадают в ленту менеджера."""
+    Order.objects.exclude(status=Order.OrderStatus.COMPLETED).filter(
+        address__in=addresses
+    ).update(updated_at=timezone.now())
@@ -0,0 +1,1068 @@
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import timeit
+from decimal import Decimal
+from functools import reduce
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.fields.files import ImageFieldFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from phonenumber_field.phonenumber import PhoneNumber
+from PIL import Image
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from location.geocoder import geocode_cache
+from location.models import GeocodeJob, Location
+from star_burger.settings import GEOCODER_NEGATIVE_TTL
+
+from . import images
+from .fastjson import FastJSONParser, FastJSONRenderer
+from .indexes import (
+    build_product_masks,
+    get_menu_index,
+    intersect_masks,
+    iter_bits,
+)
+from .models import (
+    Banner,
+    IdempotencyKey,
+    Order,
+    OrderItem,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from .serializers import OrderSerializer
+from .views import dump_product
+
+benchmark = skipUnless(
+    os.environ.get("BENCHMARKS"), "BENCHMARKS=1 включает замеры скорости"
+)
+
+
+def create_order(address="Москва, Тверская 1", **fields):
+    return Order.objects.create(
+        firstname="Иван",
+        lastname="Иванов",
+        address=address,
+        phonenumber="+79991234567",
+        **fields,
+    )
+
+
+def order_payload(product_ids, address="Москва, Тверская 1", quantity=2):
+    """Тело запроса к /api/order/ с товарами в заданном порядке."""
+    return {
+        "products": [
+            {"product": product_id, "quantity": quantity}
+            for product_id in product_ids
+        ],
+        "firstname": "Иван",
+        "lastname": "Иванов",
+        "phonenumber": "+79991234567",
+        "address": address,
+    }
+
+
+class MatchingTest(SimpleTestCase):
+    """Битовые маски против пересечения множеств на разных объёмах."""
+
+    scales = [(100, 10), (1000, 50)]
+    benchmark_scales = [(100, 10), (1000, 50), (5000, 200)]
+    products_count = 60
+    items_per_order = 4
+
+    def make_dataset(self, orders_count, restaurants_count):
+        generator = random.Random(orders_count)
+        menu_items = [
+            (product_id, restaurant_id)
+            for product_id in range(self.products_count)
+            for restaurant_id in range(1, restaurants_count + 1)
+            if generator.random() < 0.8
+        ]
+        orders = [
+            generator.sample(range(self.products_count), self.items_per_order)
+            for _ in range(orders_count)
+        ]
+        return menu_items, orders
+
+    def match_with_sets(self, menu_items, orders):
+        product_restaurants = {}
+        for product_id, restaurant_id in menu_items:
+            product_restaurants.setdefault(product_id, []).append(
+                restaurant_id
+            )
+        return [
+            sorted(
+                reduce(
+                    set.intersection,
+                    map(
+                        set,
+                        [product_restaurants[product] for product in order],
+                    ),
+                )
+            )
+            for order in orders
+        ]
+
+    def match_with_masks(self, menu_items, orders):
+        product_masks = build_product_masks(menu_items)
+        return [
+            list(
+                iter_bits(
+                    intersect_masks(
+                        [product_masks.get(product, 0) for product in order]
+                    )
+                )
+            )
+            for order in orders
+        ]
+
+    def test_masks_match_sets(self):
+        for orders_count, restaurants_count in self.scales:
+            with self.subTest(
+                orders=orders_count, restaurants=restaurants_count
+            ):
+                menu_items, orders = self.make_dataset(
+                    orders_count, restaurants_count
+                )
+                self.assertEqual(
+                    self.match_with_masks(menu_items, orders),
+                    self.match_with_sets(menu_items, orders),
+                )
+
+    @benchmark
+    def test_benchmark(self):
+        for orders_count, restaurants_count in self.benchmark_scales:
+            with self.subTest(
+                orders=orders_count, restaurants=restaurants_count
+            ):
+                menu_items, orders = self.make_dataset(
+                    orders_count, restaurants_count
+                )
+                sets_time = timeit.timeit(
+                    lambda: self.match_with_sets(menu_items, orders), number=3
+                )
+                masks_time = timeit.timeit(
+                    lambda: self.match_with_masks(menu_items, orders), number=3
+                )
+                print(
+                    f"\n{orders_count} orders x {restaurants_count} "
+                    f"restaurants: sets {sets_time:.4f}s, "
+                    f"masks {masks_time:.4f}s"
+                )
+
+    def test_empty_order(self):
+        self.assertEqual(list(iter_bits(intersect_masks([]))), [])
+
+
+class FastJSONTest(SimpleTestCase):
+    """Совместимость с JSONRenderer из DRF и сравнение скорости."""
+
+    benchmark_products_count = 500
+
+    def make_catalog(self, products_count):
+        return [
+            {
+                "id": product_id,
+                "name": f"Бургер {product_id}",
+                "price": Decimal(product_id) + Decimal("0.50"),
+                "special_status": bool(product_id % 2),
+                "description": "Котлета, сыр, соус" * 5,
+                "category": {"id": product_id % 7, "name": "Бургеры"},
+                "image": f"/media/burger-{product_id}.jpg",
+                "restaurant": {"id": product_id, "name": "Star Burger"},
+            }
+            for product_id in range(products_count)
+        ]
+
+    def test_renders_model_values(self):
+        rendered = FastJSONRenderer().render(
+            {
+                "price": Decimal("245.50"),
+                "phonenumber": PhoneNumber.from_string(
+                    "+79991234567", region="RU"
+                ),
+                "image": ImageFieldFile(
+                    None, Product._meta.get_field("image"), "burger.jpg"
+                ),
+            }
+        )
+        self.assertEqual(
+            json.loads(rendered),
+            {
+                "price": 245.5,
+                "phonenumber": "+79991234567",
+                "image": "/media/burger.jpg",
+            },
+        )
+
+    def test_parser_rejects_broken_json(self):
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"products": ['))
+
+    def test_matches_stock_renderer(self):
+        catalog = self.make_catalog(20)
+        self.assertEqual(
+            json.loads(FastJSONRenderer().render(catalog)),
+            json.loads(JSONRenderer().render(catalog)),
+        )
+
+    @benchmark
+    def test_benchmark(self):
+        catalog = self.make_catalog(self.benchmark_products_count)
+        stock_time = timeit.timeit(
+            lambda: JSONRenderer().render(catalog), number=20
+        )
+        fast_time = timeit.timeit(
+            lambda: FastJSONRenderer().render(catalog), number=20
+        )
+        print(
+            f"\n{self.benchmark_products_count} products x 20 renders: "
+            f"stock {stock_time:.4f}s, "
+            f"fast {fast_time:.4f}s"
+        )
+
+
+class MenuIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurant = Restaurant.objects.create(
+            name="Star Burger", address="Москва", lat=55.75, lon=37.62
+        )
+        self.product = Product.objects.create(
+            name="Бургер", price=100, image="burger.jpg"
+        )
+        self.menu_item = RestaurantMenuItem.objects.create(
+            restaurant=self.restaurant, product=self.product
+        )
+
+    def test_index_is_reused_until_menu_changes(self):
+        menu_items = RestaurantMenuItem.objects.all()
+        self.assertEqual(
+            get_menu_index(menu_items),
+            {self.product.id: 1 << self.restaurant.id},
+        )
+        with self.assertNumQueries(0):
+            get_menu_index(menu_items)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item.availability = False
+            self.menu_item.save()
+
+        self.assertEqual(get_menu_index(menu_items), {})
+
+
+class OrderRestaurantsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name="Бургер", price=100, image="burger.jpg"
+        )
+        self.located = Restaurant.objects.create(
+            name="Star Burger Арбат", address="Москва", lat=55.75, lon=37.59
+        )
+        self.pending = Restaurant.objects.create(
+            name="Star Burger Тверская", address="Москва, Тверская 1"
+        )
+        for restaurant in [self.located, self.pending]:
+            RestaurantMenuItem.objects.create(
+                restaurant=restaurant, product=self.product
+            )
+        self.order = create_order("Москва, Арбат 2")
+        OrderItem.objects.create(
+            order=self.order, product=self.product, quantity=1, price=100
+        )
+
+    def get_restaurants(self):
+        order = Order.objects.filter(pk=self.order.pk)
+        return order.add_restaurants_with_products()[0].restaurant_with_product
+
+    def test_pending_restaurants_follow_nearest(self):
+        Location.objects.create(
+            address=self.order.address, lat=55.75, lon=37.6
+        )
+
+        restaurants = self.get_restaurants()
+
+        self.assertEqual(
+            [entry["restaurant"] for entry in restaurants],
+            [self.located, self.pending],
+        )
+        self.assertIn("distance", restaurants[0])
+        self.assertNotIn("distance", restaurants[1])
+
+    def test_deleted_restaurant_in_stale_index_is_skipped(self):
+        Location.objects.create(
+            address=self.order.address, lat=55.75, lon=37.6
+        )
+        self.get_restaurants()
+        # The index version is bumped on commit, so the indexes stay stale
+        self.located.delete()
+
+        self.assertEqual(
+            [entry["restaurant"] for entry in self.get_restaurants()],
+            [self.pending],
+        )
+
+    def test_unlocated_order_lists_all_restaurants(self):
+        self.assertCountEqual(
+            [entry["restaurant"] for entry in self.get_restaurants()],
+            [self.located, self.pending],
+        )
+
+
+class CatalogApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        restaurant = Restaurant.objects.create(
+            name="Star Burger", address="Москва", lat=55.75, lon=37.62
+        )
+        self.category = ProductCategory.objects.create(name="Бургеры")
+        self.product = Product.objects.create(
+            name="Бургер",
+            price=100,
+            image="burger.jpg",
+            category=self.category,
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=restaurant, product=self.product
+        )
+
+    def test_catalog_is_served_from_cache_with_etag(self):
+        response = self.client.get("/api/products/")
+        self.assertEqual(response.json()[0]["name"], "Бургер")
+        self.assertIn("stale-while-revalidate", response["Cache-Control"])
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                "/api/products/", HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_category_change_invalidates_catalog(self):
+        etag = self.client.get("/api/products/")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Роллы"
+            self.category.save()
+
+        response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()[0]["category"]["name"], "Роллы")
+
+
+class ProductPagesApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        restaurant = Restaurant.objects.create(name="Star Burger")
+        self.burgers = ProductCategory.objects.create(name="Бургеры")
+        for number in range(5):
+            product = Product.objects.create(
+                name=f"Товар {number}",
+                price=100,
+                image="burger.jpg",
+                category=self.burgers if number % 2 else None,
+            )
+            RestaurantMenuItem.objects.create(
+                restaurant=restaurant, product=product
+            )
+
+    def collect_pages(self, url):
+        pages = []
+        while url:
+            with self.assertNumQueries(1):
+                page = self.client.get(url).json()
+            pages.append(page["results"])
+            url = page["next"]
+        return pages
+
+    def test_cursor_pages_cover_catalog(self):
+        pages = self.collect_pages("/api/products/?limit=2&fields=id,name")
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(
+            [product["name"] for product in sum(pages, [])],
+            [f"Товар {number}" for number in range(5)],
+        )
+        self.assertEqual(set(pages[0][0]), {"id", "name"})
+
+    def test_category_filter(self):
+        response = self.client.get(
+            "/api/products/", {"category": self.burgers.id}
+        )
+        self.assertEqual(
+            [product["name"] for product in response.json()],
+            ["Товар 1", "Товар 3"],
+        )
+
+    def test_unknown_params_share_cache_entry(self):
+        first = self.client.get("/api/products/?limit=2&x=1").json()
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/products/?x=2&limit=2").json()
+        self.assertEqual(first, second)
+        self.assertNotIn("x=", first["next"])
+
+    def test_unknown_fields(self):
+        response = self.client.get("/api/products/", {"fields": "name,secret"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("secret", response.json()["fields"][0])
+
+
+class BannersApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_seeded_banners_keep_order(self):
+        response = self.client.get("/api/banners/")
+        self.assertEqual(
+            [banner["title"] for banner in response.json()],
+            ["Burger", "Spices", "New York"],
+        )
+        self.assertIn("max-age=", response["Cache-Control"])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                "/api/banners/", HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_save_invalidates_payload(self):
+        self.client.get("/api/banners/")
+        with self.captureOnCommitCallbacks(execute=True):
+            burger = Banner.objects.get(title="Burger")
+            burger.order = 10
+            burger.save()
+
+        response = self.client.get("/api/banners/")
+        self.assertEqual(response.json()[-1]["title"], "Burger")
+
+    def test_images_are_copied_by_command(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            stdout = io.StringIO()
+            call_command("copy_banner_images", stdout=stdout)
+            call_command("copy_banner_images", stdout=stdout)
+
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(media_root, "banners"))),
+                ["burger.jpg", "food.jpg", "tasty.jpg"],
+            )
+        self.assertEqual(
+            stdout.getvalue().splitlines(),
+            ["Скопировано картинок: 3", "Скопировано картинок: 0"],
+        )
+
+
+class OrderProductsValidationTest(TestCase):
+    def setUp(self):
+        self.products = [
+            Product.objects.create(
+                name=f"Товар {number}", price=10 + number, image="burger.jpg"
+            )
+            for number in range(10)
+        ]
+
+    def test_products_are_loaded_in_one_query(self):
+        serializer = OrderSerializer(
+            data=order_payload([product.id for product in self.products])
+        )
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+
+        order = serializer.save()
+        self.assertEqual(order.total, Decimal("290.00"))
+
+    def test_all_unknown_products_are_reported(self):
+        serializer = OrderSerializer(
+            data=order_payload([998, self.products[0].id, 999])
+        )
+        with self.assertNumQueries(1):
+            self.assertFalse(serializer.is_valid())
+
+        item_errors = serializer.errors["products"]
+        self.assertIn("998", str(item_errors[0]["product"]))
+        self.assertEqual(item_errors[1], {})
+        self.assertIn("999", str(item_errors[2]["product"]))
+
+    def test_many_orders_share_one_query(self):
+        serializer = OrderSerializer(
+            data=[order_payload([product.id]) for product in self.products],
+            many=True,
+        )
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+
+
+class IdempotentOrderTest(TestCase):
+    def setUp(self):
+        self.burger = Product.objects.create(
+            name="Бургер", price=100, image="burger.jpg"
+        )
+        self.order = order_payload([self.burger.id], quantity=1)
+
+    def post_order(self, order, key="checkout-1"):
+        return self.client.post(
+            "/api/order/",
+            order,
+            content_type="application/json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_first_response(self):
+        response = self.post_order(self.order)
+        self.assertEqual(response.status_code, 201)
+
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.post_order(self.order)
+        self.assertEqual(
+            [
+                query["sql"].split()[0]
+                for query in queries.captured_queries
+                if "SAVEPOINT" not in query["sql"]
+            ],
+            ["SELECT"],
+        )
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), response.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_with_other_request(self):
+        self.post_order(self.order)
+        response = self.post_order({**self.order, "address": "Москва"})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_rejected_request_does_not_take_key(self):
+        response = self.post_order({**self.order, "products": []})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post_order(self.order).status_code, 201)
+
+    def test_expired_key_creates_new_order(self):
+        self.post_order(self.order)
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.assertNotIn("Idempotent-Replayed", self.post_order(self.order))
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+
+class OrdersBatchApiTest(TestCase):
+    def setUp(self):
+        self.burger, self.fries = [
+            Product.objects.create(name=name, price=price, image="burger.jpg")
+            for name, price in [("Бургер", 100), ("Картошка", 50)]
+        ]
+
+    def test_results_follow_request_order(self):
+        orders = [
+            order_payload([self.burger.id]),
+            order_payload([self.fries.id, 999], address="Москва, Арбат 2"),
+            order_payload([self.fries.id], address=""),
+            order_payload(
+                [self.burger.id, self.fries.id], address="Москва, Арбат 2"
+            ),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/order/batch/", orders, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 200)
+
+        results = response.json()
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["created", "rejected", "rejected", "created"],
+        )
+        self.assertIn("products", results[1]["errors"])
+        self.assertIn("address", results[2]["errors"])
+        self.assertEqual(
+            Order.objects.get(pk=results[3]["id"]).total, Decimal("300.00")
+        )
+        self.assertEqual(OrderItem.objects.count(), 3)
+        self.assertEqual(
+            set(GeocodeJob.objects.values_list("address", flat=True)),
+            {"Москва, Тверская 1", "Москва, Арбат 2"},
+        )
+        product_queries = [
+            query
+            for query in queries.captured_queries
+            if 'FROM "foodcartapp_product"' in query["sql"]
+        ]
+        self.assertEqual(len(product_queries), 1)
+
+    def test_rejects_malformed_batch(self):
+        response = self.client.post(
+            "/api/order/batch/",
+            order_payload([self.burger.id]),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RestaurantMenuApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.star_burger, self.burger_king = [
+            Restaurant.objects.create(name=name, address="Москва")
+            for name in ["Star Burger", "Burger King"]
+        ]
+        self.burger, self.fries = [
+            Product.objects.create(name=name, price=100, image="burger.jpg")
+            for name in ["Бургер", "Картошка"]
+        ]
+        self.menu_item = RestaurantMenuItem.objects.create(
+            restaurant=self.star_burger, product=self.burger
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=self.star_burger, product=self.fries, availability=False
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=self.burger_king, product=self.fries
+        )
+
+    def get_menu(self, restaurant):
+        return self.client.get(f"/api/restaurants/{restaurant.id}/menu/")
+
+    def test_menu_is_built_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.get_menu(self.star_burger)
+        self.assertEqual(response.json()["restaurant"]["name"], "Star Burger")
+        self.assertEqual(
+            [product["name"] for product in response.json()["products"]],
+            ["Бургер"],
+        )
+        with self.assertNumQueries(0):
+            self.get_menu(self.star_burger)
+
+    def test_unknown_restaurant(self):
+        response = self.client.get("/api/restaurants/999/menu/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_menu_change_invalidates_only_its_restaurant(self):
+        star_burger_etag = self.get_menu(self.star_burger)["ETag"]
+        burger_king_etag = self.get_menu(self.burger_king)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item.availability = False
+            self.menu_item.save()
+
+        response = self.get_menu(self.star_burger)
+        self.assertNotEqual(response["ETag"], star_burger_etag)
+        self.assertEqual(response.json()["products"], [])
+        self.assertEqual(
+            self.get_menu(self.burger_king)["ETag"], burger_king_etag
+        )
+
+    def test_available_products(self):
+        self.assertQuerysetEqual(
+            Product.objects.available().order_by("name"),
+            [self.burger, self.fries],
+        )
+        RestaurantMenuItem.objects.update(availability=False)
+        self.assertFalse(Product.objects.available().exists())
+
+
+def make_image_file(name, size=(800, 600), color=(200, 80, 40, 255)):
+    buffer = io.BytesIO()
+    Image.new("RGBA", size, color).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ProductImagesTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        # Build right away in the test transaction instead of a thread
+        submit = mock.patch.object(
+            images._executor,
+            "submit",
+            side_effect=lambda _, product_id: images.build_product_images(
+                product_id
+            ),
+        )
+        self.submit = submit.start()
+        self.addCleanup(submit.stop)
+
+    def test_derivatives_are_built_after_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name="Бургер", price=100, image=make_image_file("burger.png")
+            )
+        product.refresh_from_db()
+
+        self.assertEqual(product.image_derivatives["thumbnail"]["width"], 100)
+        self.assertEqual(product.image_derivatives["full"]["width"], 800)
+        with Image.open(
+            product.image.storage.path(
+                product.image_derivatives["card"]["webp"]
+            )
+        ) as card:
+            self.assertEqual((card.format, card.size), ("WEBP", (400, 300)))
+        self.assertEqual(product.thumbnail_url, "/media/burger.thumbnail.jpeg")
+        srcset = dump_product(product)["srcset"]
+        self.assertEqual(
+            srcset["webp"],
+            "/media/burger.thumbnail.webp 100w, "
+            "/media/burger.card.webp 400w, "
+            "/media/burger.full.webp 800w",
+        )
+
+    def test_transparency_turns_white_in_jpeg(self):
+        for mode in ["RGBA", "LA", "P"]:
+            with self.subTest(mode=mode):
+                image = Image.new("RGBA", (10, 10), (0, 0, 0, 0))
+                if mode == "P":
+                    image = image.convert("P")
+                    image.info["transparency"] = image.getpixel((0, 0))
+                else:
+                    image = image.convert(mode)
+                self.assertEqual(
+                    images.flatten(image).getpixel((5, 5)), (255, 255, 255)
+                )
+
+    def test_transparent_png_gets_white_jpeg_background(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name="Бургер",
+                price=100,
+                image=make_image_file("burger.png", color=(0, 0, 0, 0)),
+            )
+        product.refresh_from_db()
+
+        with Image.open(
+            product.image.storage.path(
+                product.image_derivatives["card"]["jpeg"]
+            )
+        ) as card:
+            red, green, blue = card.getpixel((200, 150))
+        self.assertGreater(min(red, green, blue), 250)
+
+    def test_unchanged_image_is_not_rebuilt(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name="Бургер", price=100, image=make_image_file("burger.png")
+            )
+        product = Product.objects.get(pk=product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.price = 120
+            product.save()
+        self.assertEqual(self.submit.call_count, 1)
+
+    def test_backfill_command(self):
+        product = Product.objects.create(
+            name="Бургер", price=100, image=make_image_file("burger.png")
+        )
+        self.assertEqual(product.image_derivatives, {})
+
+        call_command("build_product_images", stdout=io.StringIO())
+
+        product.refresh_from_db()
+        self.assertEqual(
+            set(product.image_derivatives), set(images.IMAGE_SIZES)
+        )
+
+
+class SeedLoadTest(TestCase):
+    def seed(self):
+        call_command(
+            "seed_load",
+            restaurants=3,
+            categories=2,
+            products=8,
+            orders=25,
+            addresses=10,
+            batch_size=7,
+            seed=42,
+            stdout=io.StringIO(),
+        )
+        return (
+            list(Product.objects.values_list("name", "price", "category")),
+            list(
+                RestaurantMenuItem.objects.values_list(
+                    "restaurant", "product", "availability"
+                )
+            ),
+            list(Order.objects.values_list("address", "status", "total")),
+            list(OrderItem.objects.values_list("order", "product", "price")),
+        )
+
+    def test_dataset_is_deterministic(self):
+        dataset = self.seed()
+        for model in [Order, RestaurantMenuItem, Product, ProductCategory]:
+            model.objects.all().delete()
+        Restaurant.objects.all().delete()
+
+        self.assertEqual(self.seed(), dataset)
+
+    def test_dataset_is_consistent(self):
+        self.seed()
+        self.assertEqual(Order.objects.count(), 25)
+        self.assertEqual(
+            Location.objects.resolved()
+            .filter(address__in=Order.objects.values("address"))
+            .count(),
+            Order.objects.values("address").distinct().count(),
+        )
+        for order in Order.objects.prefetch_related("items"):
+            self.assertEqual(
+                order.total,
+                sum(item.price * item.quantity for item in order.items.all()),
+            )
+
+
+class GeocodeBackfillTest(TestCase):
+    places = {
+        "Москва, Тверская 1": ("37.6", "55.7"),
+        "Москва, Арбат 2": ("37.5", "55.75"),
+    }
+
+    def setUp(self):
+        for address in [
+            "Москва, Тверская 1",
+            "Москва, Тверская 1 ",
+            "Москва, Арбат 2",
+            "нигде",
+            "timeout",
+        ]:
+            create_order(address)
+        self.calls = []
+
+    def fake_fetch(self, apikey, address):
+        self.calls.append(address)
+        if address == "timeout":
+            raise TimeoutError("geocoder is down")
+        return self.places.get(address)
+
+    def run_backfill(self):
+        stdout = io.StringIO()
+        with mock.patch(
+            "foodcartapp.management.commands.geocode_backfill"
+            ".fetch_coordinates",
+            self.fake_fetch,
+        ):
+            call_command(
+                "geocode_backfill", batch_size=2, rps=0, stdout=stdout
+            )
+        return stdout.getvalue()
+
+    def test_backfill_is_resumable(self):
+        self.run_backfill()
+        self.assertEqual(
+            dict(Location.objects.values_list("normalized_address", "lat")),
+            {
+                "москва тверская 1": 55.7,
+                "москва арбат 2": 55.75,
+                "нигде": None,
+            },
+        )
+        self.assertEqual(len(self.calls), 4)
+
+        self.calls = []
+        output = self.run_backfill()
+        self.assertEqual(self.calls, ["timeout"])
+        # Only the spelling variant and the failed address are streamed
+        self.assertIn("Просмотрено 2,", output)
+
+    def test_expired_negative_is_updated(self):
+        Location.objects.create(
+            address="Москва, Арбат 2",
+            created_at=timezone.now() - GEOCODER_NEGATIVE_TTL,
+        )
+        with mock.patch(
+            "foodcartapp.management.commands.geocode_backfill"
+            ".fetch_coordinates",
+            self.fake_fetch,
+        ):
+            stdout = io.StringIO()
+            call_command(
+                "geocode_backfill", batch_size=10, rps=0, stdout=stdout
+            )
+
+        self.assertEqual(
+            Location.objects.get(normalized_address="москва арбат 2").lat,
+            55.75,
+        )
+        self.assertIn("геокодировано 3", stdout.getvalue())
+
+
+class RestaurantCoordinatesTest(TestCase):
+    def test_creation_is_single_insert(self):
+        with self.assertNumQueries(1):
+            restaurant = Restaurant.objects.create(
+                name="Star Burger", address="Москва, Тверская 1"
+            )
+        self.assertTrue(restaurant.coordinates_pending)
+
+    def test_pending_restaurants_are_located_in_batch(self):
+        Restaurant.objects.bulk_create(
+            [
+                Restaurant(name="Star Burger", address="Москва, Тверская 1"),
+                Restaurant(name="Star Burger", address="нигде"),
+            ]
+        )
+        Location.objects.create(
+            address="москва,  тверская 1", lat=55.7, lon=37.6
+        )
+
+        with self.assertNumQueries(3):
+            located = Restaurant.objects.coordinates_pending().locate()
+
+        self.assertEqual(located, 1)
+        self.assertEqual(
+            list(
+                Restaurant.objects.coordinates_pending().values_list(
+                    "address", flat=True
+                )
+            ),
+            ["нигде"],
+        )
+
+    def test_worker_retries_with_backoff(self):
+        Restaurant.objects.create(name="Star Burger", address="Москва")
+        fetch = mock.Mock(side_effect=ConnectionError("Яндекс недоступен"))
+
+        with mock.patch.object(geocode_cache, "fetch", fetch):
+            for _ in range(2):
+                call_command("geocode_worker", once=True, stdout=io.StringIO())
+
+        fetch.assert_called_once_with("Москва")
+        job = GeocodeJob.objects.get(address="Москва")
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.error, "Яндекс недоступен")
+        self.assertGreater(job.run_after, timezone.now())
+
+
+class FieldTrackerTest(TestCase):
+    def setUp(self):
+        self.order = create_order()
+
+    def test_status_change_costs_one_query(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = Order.OrderStatus.PREPARING
+        with self.assertNumQueries(1):
+            order.save()
+
+    def test_address_change_enqueues_geocoding(self):
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertFalse(order.has_changed("address"))
+        order.address = "Москва, Арбат 2"
+        self.assertTrue(order.has_changed("address"))
+        order.save()
+        self.assertFalse(order.has_changed("address"))
+        self.assertTrue(
+            GeocodeJob.objects.filter(address="Москва, Арбат 2").exists()
+        )
+
+    def test_deferred_field_counts_as_changed(self):
+        order = Order.objects.only("id").get(pk=self.order.pk)
+        self.assertTrue(order.has_changed("address"))
+
+    def test_restaurant_address_change_resets_coordinates(self):
+        restaurant = Restaurant.objects.create(
+            name="Star Burger", address="Москва", lat=55.75, lon=37.62
+        )
+        self.assertFalse(restaurant.coordinates_pending)
+        restaurant.address = "Москва, Тверская 1"
+        restaurant.save()
+        self.assertTrue(restaurant.coordinates_pending)
+
+
+class OrderTotalTest(TestCase):
+    def setUp(self):
+        self.burger = Product.objects.create(
+            name="Бургер", price=100, image="burger.jpg"
+        )
+        self.fries = Product.objects.create(
+            name="Картошка", price="45.50", image="fries.jpg"
+        )
+
+    def test_total_is_stored_on_create(self):
+        order = order_payload([self.burger.id, self.fries.id])
+        order["products"][1]["quantity"] = 1
+        response = self.client.post(
+            "/api/order/", order, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.json()["id"])
+        self.assertEqual(order.total, Decimal("245.50"))
+
+    def test_update_total_uses_item_prices(self):
+        order = create_order("Москва")
+        OrderItem.objects.create(
+            order=order, product=self.burger, price=90, quantity=3
+        )
+        Product.objects.filter(pk=self.burger.pk).update(price=500)
+
+        order.update_total()
+
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal("270.00"))
+
+
+class QueryIndexTest(TestCase):
+    """Проверяет по EXPLAIN, что горячие запросы идут по индексам."""
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # On near-empty tables Postgres prefers a sequential scan
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=plan)
+
+    def assertSearchesByIndex(self, queryset, column):
+        """Для индексов уникальности, имена которых зависят от СУБД."""
+        plan = queryset.explain()
+        self.assertIn("index", plan.lower(), msg=plan)
+        self.assertIn(column, plan, msg=plan)
+
+    def test_open_orders_page(self):
+        open_orders = Order.objects.exclude(status=Order.OrderStatus.COMPLETED)
+        self.assertUsesIndex(
+            open_orders.order_by("created_at", "id"),
+            "order_open_created_idx",
+        )
+        self.assertUsesIndex(
+            open_orders.filter(status=Order.OrderStatus.NEW).order_by(
+                "created_at", "id"
+            ),
+            "order_open_status_idx",
+        )
+
+    def test_menu_items_by_product(self):
+        self.assertUsesIndex(
+            RestaurantMenuItem.objects.filter(
+                product__in=[1, 2], availability=True
+            ).values_list("restaurant_id", flat=True),
+            "menuitem_product_avail_idx",
+        )
+
+    def test_locations_by_address(self):
+        self.assertSearchesByIndex(
+            Location.objects.filter(normalized_address__in=["a", "b"]),
+            "normalized_address",
+        )
+        self.assertSearchesByIndex(
+            Location.objects.filter(address__in=["a", "b"]), "address"
+        )
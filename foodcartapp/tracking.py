@@ -0,0 +1,34 @@
+class FieldTrackerMixin:
+    """Запоминает значения tracked_fields при загрузке модели из базы,
+    чтобы узнать об изменениях без лишнего SELECT перед сохранением."""
+
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_tracked_fields()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot_tracked_fields()
+
+    def _snapshot_tracked_fields(self):
+        deferred_fields = self.get_deferred_fields()
+        self._loaded_values = {
+            field: getattr(self, field)
+            for field in self.tracked_fields
+            if field not in deferred_fields
+        }
+
+    def has_changed(self, field):
+        """Несохранённые и неподгруженные поля считаются изменёнными."""
+        loaded_values = getattr(self, "_loaded_values", {})
+        if field not in loaded_values:
+            return True
+        return loaded_values[field] != getattr(self, field)
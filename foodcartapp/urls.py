@@ -1,6 +1,12 @@
 from django.urls import path
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import (
+    product_list_api,
+    banners_list_api,
+    register_order,
+    register_orders_batch,
+    restaurant_menu_api,
+)
 
 
 app_name = "foodcartapp"
@@ -8,5 +14,7 @@ app_name = "foodcartapp"
 urlpatterns = [
     path('products/', product_list_api),
     path('banners/', banners_list_api),
+    path('restaurants/<int:restaurant_id>/menu/', restaurant_menu_api),
     path('order/', register_order),
+    path('order/batch/', register_orders_batch),
 ]
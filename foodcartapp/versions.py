@@ -0,0 +1,27 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(name):
+    return f"version:{name}"
+
+
+def get_version(name):
+    """Текущая версия данных, общая для всех процессов через кэш."""
+    return cache.get_or_set(
+        _version_key(name), lambda: uuid4().hex, timeout=None
+    )
+
+
+def bump_version(*names):
+    """Меняет версии после коммита, чтобы другие воркеры не успели
+    пересобрать данные из незакоммиченного состояния."""
+
+    def bump():
+        cache.set_many(
+            {_version_key(name): uuid4().hex for name in names}, timeout=None
+        )
+
+    transaction.on_commit(bump)
@@ -1,94 +1,281 @@
+from hashlib import sha1
+from urllib.parse import urlencode
+
 from django.db import transaction
-from django.http import HttpRequest, JsonResponse
-from django.templatetags.static import static
+from django.http import HttpRequest
+from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from location.geocoder import fetch_coordinates
-from location.models import Location
-from star_burger.settings import YANDEX_API_KEY
+from location.jobs import enqueue_geocoding
+from star_burger.settings import (
+    BANNERS_MAX_AGE,
+    CATALOG_MAX_AGE,
+    CATALOG_STALE_WHILE_REVALIDATE,
+    ORDERS_BATCH_LIMIT,
+)
+
+from .caching import (
+    BANNERS_VERSION,
+    CATALOG_VERSION,
+    PRODUCTS_VERSION,
+    cached_json_response,
+    get_cached_json,
+    get_restaurant_menu_version,
+)
+from .idempotency import (
+    IDEMPOTENCY_KEY_HEADER,
+    IDEMPOTENCY_KEY_MAX_LENGTH,
+    claim_key,
+    get_request_fingerprint,
+    replay_response,
+    store_response,
+)
+from .images import get_srcset
+from .models import (
+    Banner,
+    Order,
+    OrderItem,
+    Product,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from .pagination import ProductCursorPagination
+from .serializers import (
+    PRODUCT_FIELDS,
+    OrderSerializer,
+    ProductListQuerySerializer,
+    preload_products,
+)
+
 
-from .models import Order, OrderItem, Product
-from .serializers import OrderSerializer
+def dump_banners():
+    return [
+        {
+            "title": banner.title,
+            "src": banner.image.url,
+            "text": banner.text,
+        }
+        for banner in Banner.objects.all()
+    ]
 
 
 def banners_list_api(request):
-    # FIXME move data to db?
-    return JsonResponse(
-        [
-            {
-                "title": "Burger",
-                "src": static("burger.jpg"),
-                "text": "Tasty Burger at your door step",
-            },
-            {
-                "title": "Spices",
-                "src": static("food.jpg"),
-                "text": "All Cuisines",
-            },
-            {
-                "title": "New York",
-                "src": static("tasty.jpg"),
-                "text": "Food is incomplete without a tasty dessert",
-            },
-        ],
-        safe=False,
-        json_dumps_params={
-            "ensure_ascii": False,
-            "indent": 4,
-        },
+    banners = get_cached_json(
+        "banners", dump_banners, [BANNERS_VERSION], timeout=None
     )
+    return cached_json_response(request, banners, max_age=BANNERS_MAX_AGE)
 
 
-@api_view(["GET"])
-def product_list_api(request):
-    products = Product.objects.select_related("category").available()
+def dump_product(product):
+    return {
+        "id": product.id,
+        "name": product.name,
+        "price": product.price,
+        "special_status": product.special_status,
+        "description": product.description,
+        "category": (
+            {
+                "id": product.category.id,
+                "name": product.category.name,
+            }
+            if product.category
+            else None
+        ),
+        "image": product.image.url,
+        "srcset": get_srcset(product.image.storage, product.image_derivatives),
+    }
+
 
+def dump_products(products, fields=PRODUCT_FIELDS):
     dumped_products = []
     for product in products:
-        dumped_product = {
+        dumped_product = dump_product(product)
+        dumped_product["restaurant"] = {
             "id": product.id,
             "name": product.name,
-            "price": product.price,
-            "special_status": product.special_status,
-            "description": product.description,
-            "category": (
-                {
-                    "id": product.category.id,
-                    "name": product.category.name,
-                }
-                if product.category
-                else None
-            ),
-            "image": product.image.url,
-            "restaurant": {
-                "id": product.id,
-                "name": product.name,
-            },
         }
-        dumped_products.append(dumped_product)
+        dumped_products.append(
+            {field: dumped_product[field] for field in fields}
+        )
+    return dumped_products
+
+
+def get_catalog_params(request):
+    """Проверенные параметры каталога в одном виде для всех запросов.
+
+    По ним строятся ключ кэша и ссылки на соседние страницы, остальные
+    параметры запроса не учитываются.
+    """
+    serializer = ProductListQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    params = {}
+    if "category" in serializer.validated_data:
+        params["category"] = serializer.validated_data["category"]
+    if serializer.validated_data.get("fields"):
+        fields = set(serializer.validated_data["fields"])
+        params["fields"] = ",".join(
+            field for field in PRODUCT_FIELDS if field in fields
+        )
+    if {"limit", "cursor"} & set(request.query_params):
+        params["limit"] = ProductCursorPagination().get_page_size(request)
+        if request.query_params.get("cursor"):
+            params["cursor"] = request.query_params["cursor"]
+    return params
+
+
+def dump_catalog_page(request, params, url):
+    """Каталог или его страница для бесконечной прокрутки.
+
+    Без limit и cursor возвращает весь отфильтрованный список, как
+    раньше, иначе — {"next", "previous", "results"}.
+    """
+    fields = PRODUCT_FIELDS
+    if "fields" in params:
+        fields = params["fields"].split(",")
+    products = Product.objects.select_related("category").available()
+    if "category" in params:
+        products = products.filter(category_id=params["category"])
+
+    if "limit" not in params:
+        return dump_products(products, fields)
+    paginator = ProductCursorPagination()
+    page = paginator.paginate_queryset(products, request)
+    # The page is shared by every request with these params, so links
+    # must not carry the extra ones of this request
+    paginator.base_url = url
+    return paginator.get_paginated_response(dump_products(page, fields)).data
+
+
+def dump_restaurant_menu(restaurant_id):
+    menu_items = list(
+        RestaurantMenuItem.objects.filter(
+            restaurant_id=restaurant_id, availability=True
+        )
+        .select_related("restaurant", "product__category")
+        .order_by("product__name")
+    )
+    # The restaurant comes with its menu items, an empty menu needs
+    # a separate lookup
+    restaurant = (
+        menu_items[0].restaurant
+        if menu_items
+        else get_object_or_404(Restaurant, pk=restaurant_id)
+    )
+    return {
+        "restaurant": {"id": restaurant.id, "name": restaurant.name},
+        "products": [dump_product(item.product) for item in menu_items],
+    }
+
+
+@api_view(["GET"])
+def product_list_api(request):
+    params = get_catalog_params(request)
+    url = request.build_absolute_uri(request.path)
+    catalog_key = "catalog"
+    # Pages carry absolute next links, so the host is part of the key
+    if params:
+        url = f"{url}?{urlencode(params)}"
+        catalog_key = f"catalog:{sha1(url.encode()).hexdigest()}"
+    catalog = get_cached_json(
+        catalog_key,
+        lambda: dump_catalog_page(request, params, url),
+        [CATALOG_VERSION],
+    )
+    return cached_json_response(
+        request,
+        catalog,
+        max_age=CATALOG_MAX_AGE,
+        stale_while_revalidate=CATALOG_STALE_WHILE_REVALIDATE,
+    )
+
 
-    return Response(dumped_products)
+@api_view(["GET"])
+def restaurant_menu_api(request, restaurant_id):
+    menu = get_cached_json(
+        f"restaurant-menu:{restaurant_id}",
+        lambda: dump_restaurant_menu(restaurant_id),
+        [PRODUCTS_VERSION, get_restaurant_menu_version(restaurant_id)],
+    )
+    return cached_json_response(
+        request,
+        menu,
+        max_age=CATALOG_MAX_AGE,
+        stale_while_revalidate=CATALOG_STALE_WHILE_REVALIDATE,
+    )
 
 
 @transaction.atomic
 @api_view(["POST"])
 def register_order(request: HttpRequest):
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if key and len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValidationError(
+            f"{IDEMPOTENCY_KEY_HEADER} длиннее "
+            f"{IDEMPOTENCY_KEY_MAX_LENGTH} символов"
+        )
+    if key:
+        fingerprint = get_request_fingerprint(request)
+        replayed_response = replay_response(key, fingerprint)
+        if replayed_response:
+            return replayed_response
 
     serializer = OrderSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
-    serialize_order = serializer.validated_data
-    address = serialize_order.get("address")
 
-    order = serializer.save()
+    # Claimed after validation so that rejected requests leave no key
+    if key:
+        idempotency_key = claim_key(key, fingerprint)
+        if idempotency_key is None:
+            return replay_response(key, fingerprint)
 
-    coordinates = fetch_coordinates(YANDEX_API_KEY, order.address)
-    if coordinates:
-        lon, lat = coordinates
-        Location.objects.get_or_create(address=address, lat=lat, lon=lon)
+    order = serializer.save()
+    enqueue_geocoding([order.address])
 
-    return Response(
+    response = Response(
         data=OrderSerializer(order).data,
         status=status.HTTP_201_CREATED,
     )
+    if key:
+        store_response(idempotency_key, response)
+    return response
+
+
+@transaction.atomic
+@api_view(["POST"])
+def register_orders_batch(request: HttpRequest):
+    """Пачка заказов от партнёров: невалидные заказы не мешают остальным.
+
+    Отвечает списком результатов в порядке заказов из запроса.
+    """
+    orders_data = request.data
+    if not isinstance(orders_data, list):
+        raise ValidationError("Ожидается список заказов")
+    if len(orders_data) > ORDERS_BATCH_LIMIT:
+        raise ValidationError(
+            f"Не больше {ORDERS_BATCH_LIMIT} заказов за один запрос"
+        )
+
+    context = {}
+    preload_products(context, orders_data)
+    results = []
+    valid_orders = []
+    for order_data in orders_data:
+        serializer = OrderSerializer(data=order_data, context=context)
+        if serializer.is_valid():
+            valid_orders.append(serializer.validated_data)
+            results.append({"status": "created"})
+        else:
+            results.append({"status": "rejected", "errors": serializer.errors})
+
+    orders = OrderSerializer(many=True).create(valid_orders)
+    enqueue_geocoding({order.address for order in orders})
+
+    created_results = (
+        result for result in results if result["status"] == "created"
+    )
+    for result, order in zip(created_results, orders):
+        result["id"] = order.id
+    return Response(results)
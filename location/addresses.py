@@ -0,0 +1,49 @@
+import re
+
+# Canonical forms of address tokens. Markers like "г." and "д." are kept:
+# dropping them merges different places, e.g. the village "д. Ивановка"
+# and the town "Ивановка"
+ADDRESS_ABBREVIATIONS = {
+    "г": "город",
+    "гор": "город",
+    "д": "дом",
+    "ул": "улица",
+    "пр": "проспект",
+    "пр-т": "проспект",
+    "просп": "проспект",
+    "пр-кт": "проспект",
+    "пр-д": "проезд",
+    "пер": "переулок",
+    "б-р": "бульвар",
+    "бул": "бульвар",
+    "бульв": "бульвар",
+    "пл": "площадь",
+    "ш": "шоссе",
+    "наб": "набережная",
+    "туп": "тупик",
+    "мкр": "микрорайон",
+    "мкрн": "микрорайон",
+    "мкр-н": "микрорайон",
+    "обл": "область",
+    "р-н": "район",
+    "к": "корпус",
+    "корп": "корпус",
+    "стр": "строение",
+    "кв": "квартира",
+}
+
+PUNCTUATION = re.compile(r"[.,;:!?\"'«»()\[\]№#]+")
+DASHES = re.compile(r"\s*[-–—]\s*")
+
+
+def normalize_address(address):
+    """Приводит адрес к ключу для поиска в кэше координат.
+
+    "ул. Ленина, д. 5 " и "улица Ленина дом 5" дают "улица ленина дом 5".
+    """
+    address = address.casefold().replace("ё", "е")
+    address = PUNCTUATION.sub(" ", address)
+    address = DASHES.sub("-", address)
+    return " ".join(
+        ADDRESS_ABBREVIATIONS.get(token, token) for token in address.split()
+    )
@@ -1,8 +1,15 @@
 from django.contrib import admin
 
-from .models import Location
+from .models import GeocodeJob, Location
 
 
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(GeocodeJob)
+class GeocodeJobAdmin(admin.ModelAdmin):
+    list_display = ["address", "status", "attempts", "run_after"]
+    list_filter = ["status"]
+    search_fields = ["address"]
@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from star_burger.settings import GEOCODER_NEGATIVE_TTL
+
+from .addresses import normalize_address
+from .models import Location
+
+
+class RateLimiter:
+    """Пропускает не больше rate вызовов wait() в секунду на все потоки."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def iter_batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def exclude_fresh_addresses(queryset, field="address"):
+    """Отбрасывает строки, адрес которых уже есть в Location дословно.
+
+    Варианты написания этим фильтром не ловятся, их отсеет
+    find_unknown_addresses по нормализованному ключу.
+    """
+    fresh_locations = Location.objects.fresh(GEOCODER_NEGATIVE_TTL).filter(
+        address=OuterRef(field)
+    )
+    return queryset.exclude(Exists(fresh_locations))
+
+
+def find_unknown_addresses(addresses):
+    """Адреса, которых нет в Location или которые не были найдены
+    дольше GEOCODER_NEGATIVE_TTL, по одному на нормализованный ключ."""
+    normalized_addresses = {}
+    for address in addresses:
+        normalized_addresses.setdefault(normalize_address(address), address)
+    known_addresses = set(
+        Location.objects.fresh(GEOCODER_NEGATIVE_TTL)
+        .filter(normalized_address__in=normalized_addresses)
+        .values_list("normalized_address", flat=True)
+    )
+    return {
+        normalized_address: address
+        for normalized_address, address in normalized_addresses.items()
+        if normalized_address not in known_addresses
+    }
+
+
+def backfill_locations(addresses, fetch, workers=4, rate=10, batch_size=100):
+    """Геокодирует адреса пачками и сохраняет их в Location.
+
+    Каждая пачка сохраняется сразу, поэтому прерванный запуск можно
+    повторить: уже найденные адреса будут пропущены. Адреса, на которых
+    геокодер упал, не сохраняются и попадут в следующий запуск.
+    Устаревшие ненайденные адреса обновляются на месте.
+    Генерирует по словарю статистики на пачку.
+    """
+    rate_limiter = RateLimiter(rate)
+
+    def resolve(address):
+        rate_limiter.wait()
+        try:
+            return fetch(address), None
+        except Exception as error:
+            return None, error
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in iter_batches(addresses, batch_size):
+            started_at = time.monotonic()
+            unknown_addresses = find_unknown_addresses(batch)
+            results = executor.map(resolve, unknown_addresses.values())
+
+            stale_locations = Location.objects.filter(
+                normalized_address__in=unknown_addresses
+            ).in_bulk(field_name="normalized_address")
+
+            new_locations = []
+            updated_locations = []
+            failed = 0
+            now = timezone.now()
+            for (normalized_address, address), (coordinates, error) in zip(
+                unknown_addresses.items(), results
+            ):
+                if error:
+                    failed += 1
+                    continue
+                lon, lat = coordinates or (None, None)
+                location = stale_locations.get(normalized_address)
+                if location:
+                    location.lat, location.lon = lat, lon
+                    location.created_at = now
+                    updated_locations.append(location)
+                    continue
+                new_locations.append(
+                    Location(
+                        address=address,
+                        normalized_address=normalized_address,
+                        lat=lat,
+                        lon=lon,
+                        created_at=now,
+                    )
+                )
+            Location.objects.bulk_create(new_locations, ignore_conflicts=True)
+            Location.objects.bulk_update(
+                updated_locations, ["lat", "lon", "created_at"]
+            )
+
+            # Rows dropped as conflicts with a concurrent writer keep
+            # their own created_at
+            written = 0
+            if new_locations or updated_locations:
+                written = Location.objects.filter(
+                    normalized_address__in=unknown_addresses, created_at=now
+                ).count()
+
+            yield {
+                "seen": len(batch),
+                "geocoded": written,
+                "failed": failed,
+                "seconds": time.monotonic() - started_at,
+            }
@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+
+import requests
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from star_burger.settings import (
+    GEOCODER_BACKEND,
+    GEOCODER_CONNECT_TIMEOUT,
+    GEOCODER_READ_TIMEOUT,
+    GEOCODER_RETRIES,
+    GEOCODER_URL,
+)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GeocoderError(Exception):
+    pass
+
+
+class GeocoderUnavailable(GeocoderError):
+    """Геокодер недоступен: автомат разомкнут, запрос не отправлялся."""
+
+
+class GeocoderBackend:
+    """Интерфейс конкретного API геокодирования."""
+
+    def __init__(self, apikey, base_url):
+        self.apikey = apikey
+        self.base_url = base_url
+
+    def build_params(self, address):
+        raise NotImplementedError
+
+    def parse_response(self, payload):
+        """Возвращает пару (lon, lat) или None, если адрес не найден."""
+        raise NotImplementedError
+
+
+class YandexGeocoderBackend(GeocoderBackend):
+    def build_params(self, address):
+        return {
+            "geocode": address,
+            "apikey": self.apikey,
+            "format": "json",
+        }
+
+    def parse_response(self, payload):
+        found_places = payload["response"]["GeoObjectCollection"][
+            "featureMember"
+        ]
+
+        if not found_places:
+            return None
+
+        most_relevant = found_places[0]
+        lon, lat = most_relevant["GeoObject"]["Point"]["pos"].split(" ")
+        return lon, lat
+
+
+class CircuitBreaker:
+    """После failure_threshold ошибок подряд отклоняет запросы
+    reset_timeout секунд, затем пропускает один пробный."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class GeocoderClient:
+    def __init__(
+        self,
+        backend,
+        timeout=(GEOCODER_CONNECT_TIMEOUT, GEOCODER_READ_TIMEOUT),
+        retries=GEOCODER_RETRIES,
+        backoff=0.5,
+        breaker=None,
+        pool_size=10,
+    ):
+        self.backend = backend
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def geocode(self, address):
+        if not self.breaker.allow_request():
+            raise GeocoderUnavailable("Geocoder circuit is open")
+
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.get(
+                    self.backend.base_url,
+                    params=self.backend.build_params(address),
+                    timeout=self.timeout,
+                )
+                if response.status_code in RETRYABLE_STATUSES:
+                    response.raise_for_status()
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.HTTPError,
+            ) as error:
+                last_error = error
+            else:
+                break
+
+            if attempt < self.retries:
+                time.sleep(random.uniform(0, self.backoff * 2**attempt))
+        else:
+            self.breaker.record_failure()
+            raise GeocoderError(str(last_error)) from last_error
+
+        # The geocoder is up, but rejected this request: not a reason to
+        # open the circuit, and not a success either
+        if not response.ok:
+            raise GeocoderError(
+                f"Geocoder returned {response.status_code} for {address!r}"
+            )
+        self.breaker.record_success()
+        try:
+            return self.backend.parse_response(response.json())
+        except (ValueError, KeyError, IndexError, TypeError) as error:
+            raise GeocoderError(
+                f"Unexpected geocoder response: {error!r}"
+            ) from error
+
+
+_clients = {}
+
+
+def get_geocoder_client(apikey):
+    """Общий клиент на процесс, чтобы переиспользовать соединения."""
+    if apikey not in _clients:
+        backend_class = import_string(GEOCODER_BACKEND)
+        _clients[apikey] = GeocoderClient(backend_class(apikey, GEOCODER_URL))
+    return _clients[apikey]
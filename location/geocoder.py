@@ -1,53 +1,202 @@
-import requests
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+from django.utils import timezone
 from geopy import distance
 
+from star_burger.settings import (
+    GEOCODER_CACHE_SIZE,
+    GEOCODER_NEGATIVE_TTL,
+    YANDEX_API_KEY,
+)
+
+from .addresses import normalize_address
+from .client import get_geocoder_client
 from .models import Location
 
+EARTH_RADIUS_KM = 6371.0088
+
+# Accuracy modes of calculate_distance_matrix, relative error against
+# the WGS-84 geodesic:
+#   geodesic        — exact, computed pair by pair with geopy (slow);
+#   haversine       — great circle on a sphere, error below 0.6%;
+#   equirectangular — flat projection, error below 0.6% for distances
+#                     under 100 km and latitudes within ±70°.
+DISTANCE_MODES = ("geodesic", "haversine", "equirectangular")
+
 
 def fetch_coordinates(apikey, address):
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    response = requests.get(
-        base_url,
-        params={
-            "geocode": address,
-            "apikey": apikey,
-            "format": "json",
-        },
-    )
-    response.raise_for_status()
-    found_places = response.json()["response"]["GeoObjectCollection"][
-        "featureMember"
-    ]
+    return get_geocoder_client(apikey).geocode(address)
+
+
+class GeocodeCache:
+    """Кэш геокодера: LRU в памяти процесса, затем таблица Location,
+    затем запрос к API.
+
+    Ненайденные адреса тоже запоминаются — на negative_ttl.
+    Возвращает пару (lon, lat), как fetch_coordinates, или None.
+    """
+
+    def __init__(
+        self,
+        fetch,
+        maxsize=GEOCODER_CACHE_SIZE,
+        negative_ttl=GEOCODER_NEGATIVE_TTL,
+    ):
+        self.fetch = fetch
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self.stats = Counter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def geocode(self, address):
+        normalized_address = normalize_address(address)
+        found, coordinates = self._get_from_memory(normalized_address)
+        if found:
+            self.stats["memory_hits"] += 1
+            return coordinates
+
+        location = (
+            Location.objects.fresh(self.negative_ttl)
+            .filter(normalized_address=normalized_address)
+            .first()
+        )
+        if location:
+            self.stats["db_hits"] += 1
+            return self._remember(location)
+
+        self.stats["misses"] += 1
+        coordinates = self.fetch(address)
+        lon, lat = coordinates or (None, None)
+        location, _ = Location.objects.update_or_create(
+            normalized_address=normalized_address,
+            defaults={
+                "address": address,
+                "lat": lat,
+                "lon": lon,
+                "created_at": timezone.now(),
+            },
+        )
+        return self._remember(location)
+
+    def _get_from_memory(self, normalized_address):
+        with self._lock:
+            if normalized_address not in self._entries:
+                return False, None
+            coordinates, expires_at = self._entries[normalized_address]
+            if expires_at and expires_at < timezone.now():
+                del self._entries[normalized_address]
+                return False, None
+            self._entries.move_to_end(normalized_address)
+            return True, coordinates
+
+    def _remember(self, location):
+        if location.lat is None:
+            coordinates = None
+            expires_at = location.created_at + self.negative_ttl
+            self.stats["negative"] += 1
+        else:
+            coordinates = (float(location.lon), float(location.lat))
+            expires_at = None
+
+        key = location.normalized_address
+        with self._lock:
+            self._entries[key] = (coordinates, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return coordinates
 
-    if not found_places:
-        return None
 
-    most_relevant = found_places[0]
-    lon, lat = most_relevant["GeoObject"]["Point"]["pos"].split(" ")
-    return lon, lat
+def _fetch_with_default_key(address):
+    return fetch_coordinates(YANDEX_API_KEY, address)
+
+
+geocode_cache = GeocodeCache(_fetch_with_default_key)
 
 
 def calculate_distance(from_coordinates, to_coordinates):
     return round(distance.distance(from_coordinates, to_coordinates).km, 3)
 
 
+def calculate_distance_matrix(origins, destinations, mode="haversine"):
+    """Расстояния в км между всеми парами точек (lat, lon).
+
+    Возвращает массив формы (len(origins), len(destinations)).
+    """
+    if mode not in DISTANCE_MODES:
+        raise ValueError(f"Unknown distance mode: {mode}")
+
+    origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+    destinations = np.asarray(destinations, dtype=float).reshape(-1, 2)
+
+    if mode == "geodesic":
+        return np.array(
+            [
+                [
+                    distance.distance(origin, destination).km
+                    for destination in destinations
+                ]
+                for origin in origins
+            ],
+            dtype=float,
+        ).reshape(len(origins), len(destinations))
+
+    lat1, lon1 = np.radians(origins).T[:, :, np.newaxis]
+    lat2, lon2 = np.radians(destinations).T[:, np.newaxis, :]
+
+    if mode == "haversine":
+        half_chord = (
+            np.sin((lat2 - lat1) / 2) ** 2
+            + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(half_chord))
+
+    x = (lon2 - lon1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_KM * np.hypot(x, y)
+
+
 def get_locations(addresses):
+    """Координаты (lat, lon) по адресам в том виде, в каком их ввели."""
+    normalized_addresses = {
+        address: normalize_address(address) for address in addresses
+    }
+    coordinates = {
+        normalized_address: (lat, lon)
+        for normalized_address, lat, lon in Location.objects.resolved()
+        .filter(normalized_address__in=normalized_addresses.values())
+        .values_list("normalized_address", "lat", "lon")
+    }
     return {
-        location.address: (location.lat, location.lon)
-        for location in Location.objects.filter(address__in=addresses)
+        address: coordinates[normalized_address]
+        for address, normalized_address in normalized_addresses.items()
+        if normalized_address in coordinates
     }
 
 
-def calculate_restaurant_distances(restaurants, order_location):
+def sort_restaurants_by_distance(restaurants, distances):
     return sorted(
         [
             {
                 "restaurant": restaurant,
-                "distance": calculate_distance(
-                    (restaurant.lat, restaurant.lon), order_location
-                ),
+                "distance": round(float(restaurant_distance), 3),
             }
-            for restaurant in restaurants
+            for restaurant, restaurant_distance in zip(restaurants, distances)
         ],
         key=lambda x: x["distance"],
     )
+
+
+def calculate_restaurant_distances(
+    restaurants, order_location, mode="geodesic"
+):
+    restaurants = list(restaurants)
+    distances = calculate_distance_matrix(
+        [order_location],
+        [(restaurant.lat, restaurant.lon) for restaurant in restaurants],
+        mode,
+    )
+    return sort_restaurants_by_distance(restaurants, distances[0])
@@ -0,0 +1,122 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from star_burger.settings import GEOCODER_NEGATIVE_TTL
+
+from .addresses import normalize_address
+from .models import GeocodeJob, Location
+
+logger = logging.getLogger(__name__)
+
+JOB_LEASE = timedelta(minutes=5)
+MAX_ATTEMPTS = 5
+
+ACTIVE_STATUSES = [GeocodeJob.JobStatus.PENDING, GeocodeJob.JobStatus.RUNNING]
+
+# Sent with addresses whose jobs are done or failed for good
+geocoding_finished = Signal()
+
+
+def enqueue_geocoding(addresses):
+    """Ставит в очередь адреса, для которых ещё нет координат.
+
+    Завершённые и упавшие задачи по таким адресам запускаются заново.
+    """
+    normalized_addresses = {
+        address: normalize_address(address) for address in addresses
+    }
+    known_addresses = set(
+        Location.objects.fresh(GEOCODER_NEGATIVE_TTL)
+        .filter(normalized_address__in=normalized_addresses.values())
+        .values_list("normalized_address", flat=True)
+    )
+    addresses = [
+        address
+        for address, normalized_address in normalized_addresses.items()
+        if normalized_address not in known_addresses
+    ]
+    GeocodeJob.objects.bulk_create(
+        [GeocodeJob(address=address) for address in addresses],
+        ignore_conflicts=True,
+    )
+    GeocodeJob.objects.filter(address__in=addresses).exclude(
+        status__in=ACTIVE_STATUSES
+    ).update(
+        status=GeocodeJob.JobStatus.PENDING,
+        attempts=0,
+        run_after=timezone.now(),
+        error="",
+    )
+
+
+def get_pending_addresses(addresses):
+    return set(
+        GeocodeJob.objects.filter(
+            address__in=addresses, status__in=ACTIVE_STATUSES
+        ).values_list("address", flat=True)
+    )
+
+
+def claim_jobs(limit):
+    """Забирает задачи в работу, не блокируя другие воркеры.
+
+    Задача в статусе RUNNING с истёкшей арендой считается брошенной
+    упавшим воркером и забирается снова.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            GeocodeJob.objects.select_for_update(skip_locked=True)
+            .filter(status__in=ACTIVE_STATUSES, run_after__lte=now)
+            .order_by("run_after")[:limit]
+        )
+        GeocodeJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=GeocodeJob.JobStatus.RUNNING, run_after=now + JOB_LEASE
+        )
+    return jobs
+
+
+def run_job(job, geocode):
+    """geocode сам сохраняет результат в Location, см. GeocodeCache."""
+    try:
+        geocode(job.address)
+    except Exception as error:
+        job.attempts += 1
+        job.error = str(error)
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = GeocodeJob.JobStatus.FAILED
+            logger.warning(
+                "Адрес %s не геокодирован за %s попыток: %s",
+                job.address,
+                job.attempts,
+                error,
+            )
+        else:
+            job.status = GeocodeJob.JobStatus.PENDING
+            job.run_after = timezone.now() + timedelta(minutes=2**job.attempts)
+        job.save(update_fields=["attempts", "error", "status", "run_after"])
+        return False
+
+    job.status = GeocodeJob.JobStatus.DONE
+    job.error = ""
+    job.save(update_fields=["status", "error"])
+    return True
+
+
+def process_geocode_jobs(geocode, limit=50):
+    """Выполняет до limit задач, возвращает число обработанных."""
+    jobs = claim_jobs(limit)
+    for job in jobs:
+        run_job(job, geocode)
+    finished_addresses = [
+        job.address for job in jobs if job.status not in ACTIVE_STATUSES
+    ]
+    if finished_addresses:
+        geocoding_finished.send(
+            sender=GeocodeJob, addresses=finished_addresses
+        )
+    return len(jobs)
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0002_geocodejob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='location',
+            name='lat',
+            field=models.FloatField(blank=True, db_index=True, null=True, verbose_name='Широта'),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='lon',
+            field=models.FloatField(blank=True, db_index=True, null=True, verbose_name='Долгота'),
+        ),
+    ]
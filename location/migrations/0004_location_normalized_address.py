@@ -0,0 +1,100 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:49
+
+import re
+
+from django.db import migrations, models
+
+# A copy of location.addresses as of this migration, so later changes
+# to the rules do not change what it does
+ADDRESS_ABBREVIATIONS = {
+    'г': '',
+    'гор': '',
+    'город': '',
+    'д': '',
+    'дом': '',
+    'ул': 'улица',
+    'пр': 'проспект',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'пр-кт': 'проспект',
+    'пр-д': 'проезд',
+    'пер': 'переулок',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'бульв': 'бульвар',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'туп': 'тупик',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'мкр-н': 'микрорайон',
+    'обл': 'область',
+    'р-н': 'район',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+
+PUNCTUATION = re.compile(r'[.,;:!?\"\'«»()\[\]№#]+')
+DASHES = re.compile(r'\s*[-–—]\s*')
+
+
+def normalize_address(address):
+    address = address.casefold().replace('ё', 'е')
+    address = PUNCTUATION.sub(' ', address)
+    address = DASHES.sub('-', address)
+    tokens = [
+        ADDRESS_ABBREVIATIONS.get(token, token) for token in address.split()
+    ]
+    return ' '.join(token for token in tokens if token)
+
+
+def fill_normalized_addresses(apps, schema_editor):
+    """Заполняет ключ и схлопывает адреса, совпавшие после нормализации.
+
+    Из дублей остаётся строка с координатами, а среди них самая свежая.
+    """
+    Location = apps.get_model('location', 'Location')
+    kept_locations = {}
+    duplicates = []
+    for location in Location.objects.order_by('-created_at').iterator():
+        location.normalized_address = normalize_address(location.address)
+        kept = kept_locations.get(location.normalized_address)
+        if kept is None:
+            kept_locations[location.normalized_address] = location
+        elif kept.lat is None and location.lat is not None:
+            duplicates.append(kept.pk)
+            kept_locations[location.normalized_address] = location
+        else:
+            duplicates.append(location.pk)
+
+    for start in range(0, len(duplicates), 500):
+        Location.objects.filter(pk__in=duplicates[start:start + 500]).delete()
+    Location.objects.bulk_update(
+        kept_locations.values(), ['normalized_address'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0003_location_nullable_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='normalized_address',
+            field=models.CharField(editable=False, max_length=255, null=True, verbose_name='Нормализованный адрес'),
+        ),
+        migrations.RunPython(
+            fill_normalized_addresses, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='normalized_address',
+            field=models.CharField(editable=False, max_length=255, unique=True, verbose_name='Нормализованный адрес'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 3.2.15 on 2026-10-18 18:35
+
+import re
+
+from django.db import migrations
+
+# A copy of location.addresses as of this migration, so later changes
+# to the rules do not change what it does
+ADDRESS_ABBREVIATIONS = {
+    'г': 'город',
+    'гор': 'город',
+    'д': 'дом',
+    'ул': 'улица',
+    'пр': 'проспект',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'пр-кт': 'проспект',
+    'пр-д': 'проезд',
+    'пер': 'переулок',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'бульв': 'бульвар',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'туп': 'тупик',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'мкр-н': 'микрорайон',
+    'обл': 'область',
+    'р-н': 'район',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+
+PUNCTUATION = re.compile(r'[.,;:!?\"\'«»()\[\]№#]+')
+DASHES = re.compile(r'\s*[-–—]\s*')
+
+
+def normalize_address(address):
+    address = address.casefold().replace('ё', 'е')
+    address = PUNCTUATION.sub(' ', address)
+    address = DASHES.sub('-', address)
+    return ' '.join(
+        ADDRESS_ABBREVIATIONS.get(token, token) for token in address.split()
+    )
+
+
+def renormalize_addresses(apps, schema_editor):
+    """Пересчитывает ключи с сохранёнными «г.» и «д.».
+
+    Новые ключи только различают больше адресов, поэтому уникальные
+    старые ключи не могут совпасть после пересчёта.
+    """
+    Location = apps.get_model('location', 'Location')
+    changed_locations = []
+    for location in Location.objects.iterator():
+        normalized_address = normalize_address(location.address)
+        if normalized_address != location.normalized_address:
+            location.normalized_address = normalized_address
+            changed_locations.append(location)
+    Location.objects.bulk_update(
+        changed_locations, ['normalized_address'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0004_location_normalized_address'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            renormalize_addresses, migrations.RunPython.noop
+        ),
+    ]
@@ -1,18 +1,75 @@
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 
+from .addresses import normalize_address
+
+
+class LocationQuerySet(models.QuerySet):
+    def resolved(self):
+        return self.filter(lat__isnull=False, lon__isnull=False)
+
+    def fresh(self, negative_ttl):
+        """Найденные адреса и ненайденные, срок которых не истёк."""
+        return self.filter(
+            Q(lat__isnull=False)
+            | Q(created_at__gte=timezone.now() - negative_ttl)
+        )
+
 
 class Location(models.Model):
     address = models.CharField(
         "Адрес", max_length=150, unique=True, db_index=True
     )
-    lat = models.FloatField("Широта", db_index=True, blank=True)
-    lon = models.FloatField("Долгота", db_index=True, blank=True)
+    normalized_address = models.CharField(
+        "Нормализованный адрес",
+        max_length=255,
+        unique=True,
+        editable=False,
+    )
+    lat = models.FloatField("Широта", db_index=True, blank=True, null=True)
+    lon = models.FloatField("Долгота", db_index=True, blank=True, null=True)
     created_at = models.DateTimeField("Создан", default=timezone.now)
 
+    objects = LocationQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Местоположение"
         verbose_name_plural = "Местоположения"
 
     def __str__(self):
         return self.address
+
+    def save(self, *args, **kwargs):
+        self.normalized_address = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
+
+class GeocodeJob(models.Model):
+    class JobStatus(models.TextChoices):
+        PENDING = "pending", "Ожидает"
+        RUNNING = "running", "Выполняется"
+        DONE = "done", "Выполнено"
+        FAILED = "failed", "Ошибка"
+
+    address = models.CharField("Адрес", max_length=150, unique=True)
+    status = models.CharField(
+        "Статус",
+        max_length=10,
+        choices=JobStatus.choices,
+        default=JobStatus.PENDING,
+        db_index=True,
+    )
+    attempts = models.PositiveSmallIntegerField("Попытки", default=0)
+    run_after = models.DateTimeField(
+        "Выполнить после", default=timezone.now, db_index=True
+    )
+    error = models.TextField("Ошибка", blank=True)
+    created_at = models.DateTimeField("Создано", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Задача геокодирования"
+        verbose_name_plural = "Задачи геокодирования"
+
+    def __str__(self):
+        return self.address
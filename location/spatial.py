@@ -0,0 +1,101 @@
+import heapq
+import math
+from itertools import count
+
+from .geocoder import EARTH_RADIUS_KM
+
+
+def to_unit_vector(lat, lon):
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (
+        math.cos(lat) * math.cos(lon),
+        math.cos(lat) * math.sin(lon),
+        math.sin(lat),
+    )
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1))
+
+
+class KDTree:
+    """k-d дерево точек на поверхности Земли.
+
+    Точки хранятся как единичные векторы в трёхмерном пространстве:
+    длина хорды монотонна по расстоянию по большому кругу, поэтому
+    ближайшие по хорде точки — ближайшие и на сфере.
+    """
+
+    def __init__(self, points):
+        items = [
+            (to_unit_vector(lat, lon), key)
+            for key, lat, lon in points
+            if lat is not None and lon is not None
+        ]
+        self.size = len(items)
+        self._keys = frozenset(key for _, key in items)
+        self._root = self._build(items, depth=0)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def _build(self, items, depth):
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[0][axis])
+        median = len(items) // 2
+        vector, key = items[median]
+        return (
+            vector,
+            key,
+            axis,
+            self._build(items[:median], depth + 1),
+            self._build(items[median + 1:], depth + 1),
+        )
+
+    def nearest(self, lat, lon, k=1, radius=None, candidates=None):
+        """Возвращает до k пар (расстояние в км, ключ) по возрастанию.
+
+        radius ограничивает поиск в км, candidates — множество ключей,
+        среди которых ищем.
+        """
+        if k < 1 or self._root is None:
+            return []
+
+        target = to_unit_vector(lat, lon)
+        bound = km_to_chord(radius) ** 2 if radius is not None else math.inf
+        heap = []
+        tiebreaker = count()
+
+        def visit(node):
+            nonlocal bound
+            vector, key, axis, left, right = node
+            if candidates is None or key in candidates:
+                squared = sum((a - b) ** 2 for a, b in zip(vector, target))
+                if squared <= bound:
+                    heapq.heappush(heap, (-squared, next(tiebreaker), key))
+                    if len(heap) > k:
+                        heapq.heappop(heap)
+                    if len(heap) == k:
+                        bound = -heap[0][0]
+
+            diff = target[axis] - vector[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            if near is not None:
+                visit(near)
+            if far is not None and diff**2 <= bound:
+                visit(far)
+
+        visit(self._root)
+        return [
+            (chord_to_km(math.sqrt(-squared)), key)
+            for squared, _, key in sorted(heap, reverse=True)
+        ]
@@ -1,3 +1,432 @@
-from django.test import TestCase
+import json
+import random
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from star_burger.settings import GEOCODER_NEGATIVE_TTL
+
+from .addresses import normalize_address
+from .client import (
+    CircuitBreaker,
+    GeocoderClient,
+    GeocoderError,
+    GeocoderUnavailable,
+    YandexGeocoderBackend,
+)
+from .geocoder import (
+    GeocodeCache,
+    calculate_distance,
+    calculate_distance_matrix,
+    calculate_restaurant_distances,
+    get_locations,
+)
+from .jobs import (
+    enqueue_geocoding,
+    get_pending_addresses,
+    process_geocode_jobs,
+)
+from .models import GeocodeJob, Location
+from .spatial import KDTree
+
+
+class NormalizeAddressTest(SimpleTestCase):
+    def test_variants_share_key(self):
+        variants = [
+            "ул. Ленина 5",
+            "улица Ленина, 5",
+            "Улица  ЛЕНИНА; 5 ",
+        ]
+        self.assertEqual(
+            {normalize_address(variant) for variant in variants},
+            {"улица ленина 5"},
+        )
+
+    def test_abbreviations(self):
+        self.assertEqual(
+            normalize_address("г. Москва, пр-т Мира, д.1, корп. 2"),
+            "город москва проспект мира дом 1 корпус 2",
+        )
+        self.assertEqual(
+            normalize_address("Ростов - на - Дону, Пушкинская ул., 5/2"),
+            "ростов-на-дону пушкинская улица 5/2",
+        )
+        self.assertEqual(normalize_address("Звёздный б-р"), "звездный бульвар")
+
+    def test_markers_are_kept(self):
+        self.assertNotEqual(
+            normalize_address("д. Ивановка, 5"),
+            normalize_address("Ивановка, 5"),
+        )
+
+
+class Point:
+    def __init__(self, lat, lon):
+        self.lat = lat
+        self.lon = lon
+
+
+class DistanceMatrixTest(SimpleTestCase):
+    origins = [(55.7558, 37.6173), (55.8, 37.5)]
+    destinations = [(55.75, 37.62), (55.6, 37.7), (55.9, 37.4)]
+
+    def test_shape(self):
+        matrix = calculate_distance_matrix(self.origins, self.destinations)
+        self.assertEqual(matrix.shape, (2, 3))
+        self.assertEqual(calculate_distance_matrix([], []).shape, (0, 0))
+
+    def test_modes_within_error_bound(self):
+        exact = calculate_distance_matrix(
+            self.origins, self.destinations, "geodesic"
+        )
+        for mode in ("haversine", "equirectangular"):
+            approximate = calculate_distance_matrix(
+                self.origins, self.destinations, mode
+            )
+            self.assertTrue(
+                (abs(approximate - exact) <= exact * 0.006).all(), mode
+            )
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            calculate_distance_matrix(self.origins, self.destinations, "x")
+
+    def test_restaurant_distances_wrapper(self):
+        restaurants = [Point(*point) for point in self.destinations]
+        distances = calculate_restaurant_distances(
+            restaurants, self.origins[0]
+        )
+        self.assertIs(distances[0]["restaurant"], restaurants[0])
+        self.assertEqual(
+            [item["distance"] for item in distances],
+            sorted(
+                calculate_distance(self.origins[0], point)
+                for point in self.destinations
+            ),
+        )
+
+
+class KDTreeTest(SimpleTestCase):
+    def setUp(self):
+        generator = random.Random(0)
+        self.points = [
+            (key, generator.uniform(55, 56.5), generator.uniform(36.5, 38.5))
+            for key in range(500)
+        ]
+        self.tree = KDTree(self.points)
+        self.target = (55.75, 37.62)
+
+    def brute_force(self, k, radius=None, candidates=None):
+        points = [
+            point
+            for point in self.points
+            if candidates is None or point[0] in candidates
+        ]
+        distances = calculate_distance_matrix(
+            [self.target],
+            [(lat, lon) for _, lat, lon in points],
+            "haversine",
+        )[0]
+        found = sorted(zip(distances, [point[0] for point in points]))
+        if radius is not None:
+            found = [item for item in found if item[0] <= radius]
+        return [key for _, key in found[:k]]
+
+    def test_nearest(self):
+        nearest = self.tree.nearest(*self.target, k=5)
+        self.assertEqual([key for _, key in nearest], self.brute_force(5))
+        self.assertEqual(
+            [distance for distance, _ in nearest],
+            sorted(distance for distance, _ in nearest),
+        )
+
+    def test_radius_and_candidates(self):
+        candidates = set(range(0, 500, 7))
+        nearest = self.tree.nearest(
+            *self.target, k=10, radius=15, candidates=candidates
+        )
+        self.assertEqual(
+            [key for _, key in nearest],
+            self.brute_force(10, radius=15, candidates=candidates),
+        )
+        self.assertTrue(all(distance <= 15 for distance, _ in nearest))
+
+    def test_empty(self):
+        self.assertEqual(KDTree([]).nearest(*self.target, k=3), [])
+        self.assertEqual(
+            self.tree.nearest(*self.target, k=3, candidates=set()), []
+        )
+
+
+class FakeGeocoder:
+    def __init__(self, places):
+        self.places = places
+        self.calls = []
+
+    def __call__(self, address):
+        self.calls.append(address)
+        if address == "timeout":
+            raise TimeoutError("geocoder is down")
+        return self.places.get(address)
+
+
+class GeocodeCacheTest(TestCase):
+    def setUp(self):
+        self.fetch = FakeGeocoder({"Москва, Тверская 1": ("37.6", "55.7")})
+        self.cache = GeocodeCache(self.fetch, maxsize=2)
+
+    def test_tiers(self):
+        self.assertEqual(
+            self.cache.geocode("Москва, Тверская 1"), (37.6, 55.7)
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.cache.geocode("Москва, Тверская 1"), (37.6, 55.7)
+            )
+
+        other_process_cache = GeocodeCache(self.fetch)
+        self.assertEqual(
+            other_process_cache.geocode("Москва, Тверская 1"), (37.6, 55.7)
+        )
+        self.assertEqual(self.fetch.calls, ["Москва, Тверская 1"])
+        self.assertEqual(self.cache.stats["memory_hits"], 1)
+        self.assertEqual(other_process_cache.stats["db_hits"], 1)
+
+    def test_negative_results_expire(self):
+        self.assertIsNone(self.cache.geocode("нигде"))
+        self.assertIsNone(GeocodeCache(self.fetch).geocode("нигде"))
+        self.assertEqual(self.fetch.calls, ["нигде"])
+
+        Location.objects.filter(address="нигде").update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+        self.assertIsNone(GeocodeCache(self.fetch).geocode("нигде"))
+        self.assertEqual(self.fetch.calls, ["нигде", "нигде"])
+
+    def test_address_variants_hit_same_location(self):
+        self.cache.geocode("Москва, Тверская 1")
+        self.assertEqual(
+            GeocodeCache(self.fetch).geocode("москва; тверская, 1 "),
+            (37.6, 55.7),
+        )
+        self.assertEqual(self.fetch.calls, ["Москва, Тверская 1"])
+        self.assertEqual(
+            get_locations(["Москва,  Тверская 1", "нигде"]),
+            {"Москва,  Тверская 1": (55.7, 37.6)},
+        )
+
+    def test_lru_is_bounded(self):
+        for address in ["a", "b", "c"]:
+            self.cache.geocode(address)
+        self.assertEqual(list(self.cache._entries), ["b", "c"])
+
+    def test_errors_are_not_cached(self):
+        with self.assertRaises(TimeoutError):
+            self.cache.geocode("timeout")
+        self.assertFalse(Location.objects.filter(address="timeout").exists())
+
+
+class GeocodeJobTest(TestCase):
+    def setUp(self):
+        self.geocoder = GeocodeCache(
+            FakeGeocoder({"Москва, Тверская 1": ("37.6", "55.7")})
+        ).geocode
+
+    def test_job_creates_location(self):
+        enqueue_geocoding(["Москва, Тверская 1", "нигде"])
+        self.assertEqual(
+            get_pending_addresses(["Москва, Тверская 1", "нигде"]),
+            {"Москва, Тверская 1", "нигде"},
+        )
+
+        self.assertEqual(process_geocode_jobs(self.geocoder), 2)
+
+        location = Location.objects.get(address="Москва, Тверская 1")
+        self.assertEqual((location.lat, location.lon), (55.7, 37.6))
+        self.assertIsNone(Location.objects.get(address="нигде").lat)
+        self.assertEqual(get_pending_addresses(["Москва, Тверская 1"]), set())
+
+    def test_known_address_is_not_enqueued(self):
+        Location.objects.create(address="Москва, Тверская 1", lat=1, lon=2)
+        enqueue_geocoding(["Москва, Тверская 1"])
+        self.assertFalse(GeocodeJob.objects.exists())
+
+    def test_failed_job_is_retried_later(self):
+        enqueue_geocoding(["timeout"])
+        process_geocode_jobs(self.geocoder)
+
+        job = GeocodeJob.objects.get()
+        self.assertEqual(job.status, GeocodeJob.JobStatus.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(process_geocode_jobs(self.geocoder), 0)
+
+    def test_failed_job_is_rearmed_on_enqueue(self):
+        GeocodeJob.objects.create(
+            address="Москва, Тверская 1",
+            status=GeocodeJob.JobStatus.FAILED,
+            attempts=5,
+            error="timeout",
+        )
+        enqueue_geocoding(["Москва, Тверская 1"])
+
+        job = GeocodeJob.objects.get()
+        self.assertEqual(job.status, GeocodeJob.JobStatus.PENDING)
+        self.assertEqual(job.attempts, 0)
+        self.assertEqual(
+            get_pending_addresses(["Москва, Тверская 1"]),
+            {"Москва, Тверская 1"},
+        )
+        self.assertEqual(process_geocode_jobs(self.geocoder), 1)
+        self.assertEqual(
+            Location.objects.get(address="Москва, Тверская 1").lat, 55.7
+        )
+
+    def test_expired_negative_goes_back_through_queue(self):
+        fetch = FakeGeocoder({})
+        enqueue_geocoding(["Нигде 1"])
+        process_geocode_jobs(GeocodeCache(fetch).geocode)
+
+        enqueue_geocoding(["Нигде 1"])
+        self.assertEqual(get_pending_addresses(["Нигде 1"]), set())
+
+        Location.objects.filter(address="Нигде 1").update(
+            created_at=timezone.now() - GEOCODER_NEGATIVE_TTL
+        )
+        enqueue_geocoding(["Нигде 1"])
+        self.assertEqual(get_pending_addresses(["Нигде 1"]), {"Нигде 1"})
+        self.assertEqual(process_geocode_jobs(GeocodeCache(fetch).geocode), 1)
+        self.assertEqual(fetch.calls, ["Нигде 1", "Нигде 1"])
+
+    def test_running_job_is_not_rearmed(self):
+        lease_end = timezone.now() + timedelta(minutes=5)
+        GeocodeJob.objects.create(
+            address="Москва, Тверская 1",
+            status=GeocodeJob.JobStatus.RUNNING,
+            run_after=lease_end,
+        )
+        enqueue_geocoding(["Москва, Тверская 1"])
+        job = GeocodeJob.objects.get()
+        self.assertEqual(job.status, GeocodeJob.JobStatus.RUNNING)
+        self.assertEqual(job.run_after, lease_end)
+
+
+class StubGeocoderHandler(BaseHTTPRequestHandler):
+    """Отвечает как Яндекс; поведение задаётся очередью server.replies."""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        reply = self.server.replies.pop(0) if self.server.replies else 200
+        if reply == "hang":
+            time.sleep(0.5)
+            return
+        if reply == "garbage":
+            body = b'{"response": {}}'
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        address = parse_qs(urlparse(self.path).query)["geocode"][0]
+        members = []
+        if address in self.server.places:
+            lon, lat = self.server.places[address]
+            members = [{"GeoObject": {"Point": {"pos": f"{lon} {lat}"}}}]
+        body = json.dumps(
+            {"response": {"GeoObjectCollection": {"featureMember": members}}}
+        ).encode()
+        self.send_response(reply)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class GeocoderClientTest(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), StubGeocoderHandler
+        )
+        self.server.places = {"Москва, Тверская 1": ("37.6", "55.7")}
+        self.server.replies = []
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        host, port = self.server.server_address
+        self.backend = YandexGeocoderBackend("key", f"http://{host}:{port}/")
+
+    def make_client(self, **kwargs):
+        kwargs.setdefault("backoff", 0)
+        kwargs.setdefault("timeout", (1, 0.2))
+        return GeocoderClient(self.backend, **kwargs)
+
+    def test_geocode(self):
+        client = self.make_client()
+        self.assertEqual(
+            client.geocode("Москва, Тверская 1"), ("37.6", "55.7")
+        )
+        self.assertIsNone(client.geocode("нигде"))
+
+    def test_retries_server_errors_and_timeouts(self):
+        self.server.replies = [503, "hang"]
+        client = self.make_client(retries=2)
+        self.assertEqual(
+            client.geocode("Москва, Тверская 1"), ("37.6", "55.7")
+        )
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_gives_up_after_retries(self):
+        self.server.replies = [503, 503]
+        client = self.make_client(retries=1)
+        with self.assertRaises(GeocoderError):
+            client.geocode("Москва, Тверская 1")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_circuit_breaker_fails_fast(self):
+        self.server.replies = [503] * 4
+        client = self.make_client(
+            retries=1,
+            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60),
+        )
+        for _ in range(2):
+            with self.assertRaises(GeocoderError):
+                client.geocode("Москва, Тверская 1")
+
+        with self.assertRaises(GeocoderUnavailable):
+            client.geocode("Москва, Тверская 1")
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_circuit_breaker_recovers(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        client = self.make_client(breaker=breaker)
+        self.assertEqual(
+            client.geocode("Москва, Тверская 1"), ("37.6", "55.7")
+        )
+        self.assertIsNone(breaker.opened_at)
+
+    def test_client_errors_are_not_retried_or_successes(self):
+        self.server.replies = [400]
+        breaker = CircuitBreaker(failure_threshold=5)
+        breaker.record_failure()
+        client = self.make_client(retries=2, breaker=breaker)
+
+        with self.assertRaisesRegex(GeocoderError, "400"):
+            client.geocode("Москва, Тверская 1")
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(breaker.failures, 1)
+
+    def test_unexpected_payload_raises_geocoder_error(self):
+        self.server.replies = ["garbage"]
+        with self.assertRaises(GeocoderError):
+            self.make_client().geocode("Москва, Тверская 1")
@@ -1,3 +1,154 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from foodcartapp.models import Order, OrderItem, Product
+from location.jobs import enqueue_geocoding, process_geocode_jobs
+
+from . import views
+
+
+def create_order(**fields):
+    return Order.objects.create(
+        firstname="Иван",
+        lastname="Иванов",
+        address="Москва",
+        phonenumber="+79991234567",
+        **fields,
+    )
+
+
+class ViewOrdersTest(TestCase):
+    def setUp(self):
+        manager = User.objects.create_user("manager", is_staff=True)
+        self.client.force_login(manager)
+        product = Product.objects.create(
+            name="Бургер", price=100, image="burger.jpg"
+        )
+        created_at = timezone.now()
+        for number in range(5):
+            order = create_order(
+                created_at=created_at + timedelta(minutes=number % 3),
+                payments=(
+                    Order.OrderPayments.CASH
+                    if number % 2
+                    else Order.OrderPayments.CARD
+                ),
+            )
+            OrderItem.objects.create(order=order, product=product, price=100)
+        create_order(status=Order.OrderStatus.COMPLETED)
+        self.expected_ids = list(
+            Order.objects.exclude(status=Order.OrderStatus.COMPLETED)
+            .order_by("created_at", "id")
+            .values_list("id", flat=True)
+        )
+
+    def collect_pages(self):
+        url = reverse("restaurateur:view_orders")
+        pages = []
+        while url:
+            response = self.client.get(url)
+            pages.append([order.id for order in response.context["orders"]])
+            next_page_url = response.context["next_page_url"]
+            url = next_page_url and (
+                reverse("restaurateur:view_orders") + next_page_url
+            )
+        return pages
+
+    @mock.patch.object(views, "ORDERS_PAGE_SIZE", 2)
+    def test_keyset_pages_cover_backlog(self):
+        pages = self.collect_pages()
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), self.expected_ids)
+
+    def test_filters(self):
+        response = self.client.get(
+            reverse("restaurateur:view_orders"),
+            {"payments": Order.OrderPayments.CASH, "unassigned": "on"},
+        )
+        self.assertEqual(
+            [order.payments for order in response.context["orders"]],
+            [Order.OrderPayments.CASH] * 2,
+        )
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.client.get(
+            reverse("restaurateur:view_orders"), {"after": "garbage"}
+        )
+        self.assertEqual(
+            [order.id for order in response.context["orders"]],
+            self.expected_ids,
+        )
+
+
+class OrdersFeedTest(TestCase):
+    def setUp(self):
+        manager = User.objects.create_user("manager", is_staff=True)
+        self.client.force_login(manager)
+        self.order = create_order()
+
+    def read_feed(self, **headers):
+        response = self.client.get(
+            reverse("restaurateur:view_orders_feed"),
+            {"since": self.since},
+            **headers,
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return response.content.decode()
+
+    def test_streams_changes_after_cursor(self):
+        self.since = views.encode_cursor(self.order.updated_at, self.order.id)
+        self.assertNotIn("event: order", self.read_feed())
+
+        self.order.comment = "Без лука"
+        self.order.save()
+        feed = self.read_feed()
+        self.assertIn(f'"id": {self.order.id}', feed)
+        self.assertIn("Без лука", feed)
+
+        self.order.status = Order.OrderStatus.COMPLETED
+        self.order.save()
+        self.assertIn('"html": null', self.read_feed())
+
+    def test_last_event_id_wins_over_since(self):
+        self.since = views.encode_cursor(timezone.now() - timedelta(days=1), 0)
+        last_event_id = views.encode_cursor(
+            self.order.updated_at, self.order.id
+        )
+        feed = self.read_feed(HTTP_LAST_EVENT_ID=last_event_id)
+        self.assertNotIn("event: order", feed)
+
+    def test_rejects_broken_cursor(self):
+        response = self.client.get(
+            reverse("restaurateur:view_orders_feed"), {"since": "garbage"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_finished_geocoding_is_pushed(self):
+        enqueue_geocoding([self.order.address])
+        self.since = views.encode_cursor(self.order.updated_at, self.order.id)
+
+        process_geocode_jobs(lambda address: (37.6, 55.7))
+
+        self.assertIn(f'"id": {self.order.id}', self.read_feed())
+
+    def test_resends_changes_committed_behind_cursor(self):
+        late_order = create_order()
+        # Stamped before the cursor, but committed after the client read it
+        Order.objects.filter(pk=late_order.pk).update(
+            updated_at=self.order.updated_at - timedelta(seconds=1)
+        )
+        self.since = views.encode_cursor(self.order.updated_at, self.order.id)
+
+        feed = self.read_feed()
+        self.assertIn(f'"id": {late_order.id}', feed)
+        self.assertNotIn("id: ", feed)
 
-# Create your tests here.
+        Order.objects.filter(pk=late_order.pk).update(
+            updated_at=self.order.updated_at - 2 * views.FEED_OVERLAP
+        )
+        self.assertNotIn("event: order", self.read_feed())
@@ -1,13 +1,31 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+
 from django import forms
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.decorators import user_passes_test
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import redirect, render
-from django.urls import reverse_lazy
+from django.template.loader import render_to_string
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views import View
 
 from foodcartapp.models import Order, Product, Restaurant
 
+ORDERS_PAGE_SIZE = 50
+
+FEED_RETRY_MS = 3000
+FEED_BATCH_SIZE = 100
+# updated_at is stamped before commit, so a slow transaction can land
+# behind the cursor. Changes this recent are sent again on every poll
+FEED_OVERLAP = timedelta(seconds=10)
+
 
 class Login(forms.Form):
     username = forms.CharField(
@@ -31,6 +49,48 @@ class Login(forms.Form):
     )
 
 
+class OrderFilterForm(forms.Form):
+    status = forms.ChoiceField(
+        label="Статус",
+        required=False,
+        choices=[("", "Все")]
+        + [
+            choice
+            for choice in Order.OrderStatus.choices
+            if choice[0] != Order.OrderStatus.COMPLETED
+        ],
+    )
+    payments = forms.ChoiceField(
+        label="Способ оплаты",
+        required=False,
+        choices=[("", "Все")] + Order.OrderPayments.choices,
+    )
+    restaurant = forms.ModelChoiceField(
+        label="Ресторан",
+        required=False,
+        queryset=Restaurant.objects.order_by("name"),
+        empty_label="Все",
+    )
+    unassigned = forms.BooleanField(
+        label="Без ресторана",
+        required=False,
+    )
+
+    def filter(self, orders):
+        if not self.is_valid():
+            return orders
+        filters = self.cleaned_data
+        if filters["status"]:
+            orders = orders.filter(status=filters["status"])
+        if filters["payments"]:
+            orders = orders.filter(payments=filters["payments"])
+        if filters["restaurant"]:
+            orders = orders.filter(restaurant=filters["restaurant"])
+        if filters["unassigned"]:
+            orders = orders.filter(restaurant__isnull=True)
+        return orders
+
+
 class LoginView(View):
     def get(self, request, *args, **kwargs):
         form = Login()
@@ -109,15 +169,147 @@ def view_restaurants(request):
     )
 
 
+def encode_cursor(moment, order_id):
+    cursor = f"{moment.isoformat()}|{order_id}"
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Возвращает (момент, id) или None, если курсор испорчен."""
+    try:
+        moment, order_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return parse_datetime(moment), int(order_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+
+
+def after_cursor(orders, cursor, field="created_at"):
+    moment, order_id = cursor
+    return orders.filter(
+        Q(**{f"{field}__gt": moment})
+        | Q(**{field: moment, "id__gt": order_id})
+    )
+
+
 @user_passes_test(is_manager, login_url="restaurateur:login")
 def view_orders(request):
-    orders = (
-        Order.objects.get_order_cost()
-        .prefetch_related("items__product")
-        .exclude(status=Order.OrderStatus.COMPLETED)
-        .add_restaurants_with_products()
+    filter_form = OrderFilterForm(request.GET)
+    orders = filter_form.filter(
+        Order.objects.exclude(status=Order.OrderStatus.COMPLETED)
+    ).order_by("created_at", "id")
+
+    cursor = decode_cursor(request.GET.get("after", ""))
+    if cursor and cursor[0]:
+        orders = after_cursor(orders, cursor)
+
+    page = orders.prefetch_related("items__product")[
+        :ORDERS_PAGE_SIZE
+    ].add_restaurants_with_products()
+
+    next_page_url = None
+    if len(page) == ORDERS_PAGE_SIZE:
+        last_order = page[len(page) - 1]
+        next_cursor = encode_cursor(last_order.created_at, last_order.id)
+        if after_cursor(orders, decode_cursor(next_cursor)).exists():
+            params = request.GET.copy()
+            params["after"] = next_cursor
+            next_page_url = f"?{params.urlencode()}"
+
+    first_page_params = request.GET.copy()
+    first_page_params.pop("after", None)
+
+    latest_change = Order.objects.order_by("-updated_at", "-id").first()
+    feed_params = first_page_params.copy()
+    feed_params["since"] = (
+        encode_cursor(latest_change.updated_at, latest_change.id)
+        if latest_change
+        else encode_cursor(timezone.now(), 0)
     )
 
     return render(
-        request, template_name="order_items.html", context={"orders": orders}
+        request,
+        template_name="order_items.html",
+        context={
+            "orders": page,
+            "filter_form": filter_form,
+            "next_page_url": next_page_url,
+            "first_page_url": (
+                f"?{first_page_params.urlencode()}" if cursor else None
+            ),
+            "feed_url": (
+                f"{reverse('restaurateur:view_orders_feed')}"
+                f"?{feed_params.urlencode()}"
+            ),
+            "orders_url": request.get_full_path(),
+        },
+    )
+
+
+@user_passes_test(is_manager, login_url="restaurateur:login")
+def view_orders_feed(request):
+    """Server-sent events с заказами, изменёнными после курсора.
+
+    Ответ приходит сразу и закрывается, браузер переподключается через
+    FEED_RETRY_MS и присылает последний id в Last-Event-ID. Так опрос
+    не держит воркер gunicorn.
+    """
+    cursor = decode_cursor(
+        request.headers.get("Last-Event-ID") or request.GET.get("since", "")
     )
+    if not cursor or not cursor[0]:
+        return HttpResponseBadRequest("Неверный курсор")
+
+    response = HttpResponse(
+        render_order_changes(request, OrderFilterForm(request.GET), cursor),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def render_order_changes(request, filter_form, cursor):
+    orders = Order.objects.order_by("updated_at", "id")
+    moment, _ = cursor
+    resent = []
+    # Later than that every transaction stamped before the cursor is done
+    if timezone.now() - moment < 2 * FEED_OVERLAP:
+        resent = list(
+            orders.filter(
+                updated_at__gt=moment - FEED_OVERLAP, updated_at__lt=moment
+            ).values_list("id", "updated_at")[:FEED_BATCH_SIZE]
+        )
+    changes = list(
+        after_cursor(orders, cursor, field="updated_at").values_list(
+            "id", "updated_at"
+        )[:FEED_BATCH_SIZE]
+    )
+
+    # Orders that left the filter are sent without html to be removed
+    visible_orders = {
+        order.id: order
+        for order in filter_form.filter(
+            Order.objects.exclude(status=Order.OrderStatus.COMPLETED)
+        )
+        .filter(pk__in=[order_id for order_id, _ in resent + changes])
+        .prefetch_related("items__product")
+        .add_restaurants_with_products()
+    }
+    orders_url = reverse("restaurateur:view_orders")
+    events = [f"retry: {FEED_RETRY_MS}\n\n"]
+    for order_id, updated_at in resent + changes:
+        order = visible_orders.get(order_id)
+        row = None
+        if order:
+            row = render_to_string(
+                "order_row.html",
+                {"order": order, "orders_url": orders_url},
+                request,
+            )
+        payload = json.dumps({"id": order_id, "html": row}, ensure_ascii=False)
+        # Re-sent changes go without id, so Last-Event-ID never moves back
+        if updated_at >= moment:
+            events.append(f"id: {encode_cursor(updated_at, order_id)}\n")
+        events.append(f"event: order\ndata: {payload}\n\n")
+    return "".join(events)
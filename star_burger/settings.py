@@ -13,6 +13,25 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 SECRET_KEY = env("SECRET_KEY")
 DEBUG = env.bool("DEBUG", False)
 YANDEX_API_KEY = env("YANDEX_API_KEY")
+GEOCODER_BACKEND = env.str(
+    "GEOCODER_BACKEND", "location.client.YandexGeocoderBackend"
+)
+GEOCODER_URL = env.str("GEOCODER_URL", "https://geocode-maps.yandex.ru/1.x")
+GEOCODER_CONNECT_TIMEOUT = env.float("GEOCODER_CONNECT_TIMEOUT", 3.05)
+GEOCODER_READ_TIMEOUT = env.float("GEOCODER_READ_TIMEOUT", 10)
+GEOCODER_RETRIES = env.int("GEOCODER_RETRIES", 2)
+GEOCODER_CACHE_SIZE = env.int("GEOCODER_CACHE_SIZE", 1024)
+GEOCODER_NEGATIVE_TTL = env.timedelta("GEOCODER_NEGATIVE_TTL", 86400)
+DISTANCE_MODE = env.str("DISTANCE_MODE", "haversine")
+NEAREST_RESTAURANTS_LIMIT = env.int("NEAREST_RESTAURANTS_LIMIT", 5)
+DELIVERY_RADIUS_KM = env.float("DELIVERY_RADIUS_KM", None)
+CATALOG_MAX_AGE = env.int("CATALOG_MAX_AGE", 60)
+BANNERS_MAX_AGE = env.int("BANNERS_MAX_AGE", 3600)
+ORDERS_BATCH_LIMIT = env.int("ORDERS_BATCH_LIMIT", 500)
+IDEMPOTENCY_KEY_TTL = env.timedelta("IDEMPOTENCY_KEY_TTL", 86400)
+CATALOG_STALE_WHILE_REVALIDATE = env.int(
+    "CATALOG_STALE_WHILE_REVALIDATE", 600
+)
 
 ALLOWED_HOSTS = env.list("ALLOWED_HOSTS", ["127.0.0.1", "localhost"])
 
@@ -90,6 +109,23 @@ DATABASES = {
     )
 }
 
+CACHES = {
+    "default": env.dj_cache_url("CACHE_URL", default="locmem://"),
+}
+# Django 3.2 has no built-in Redis backend, django-redis takes the same URL
+if CACHES["default"]["BACKEND"].endswith(".redis.RedisCache"):
+    CACHES["default"]["BACKEND"] = "django_redis.cache.RedisCache"
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": ["foodcartapp.fastjson.FastJSONRenderer"]
+    + (["rest_framework.renderers.BrowsableAPIRenderer"] if DEBUG else []),
+    "DEFAULT_PARSER_CLASSES": [
+        "foodcartapp.fastjson.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",